@@ -0,0 +1,184 @@
+"""Консольний інтерфейс до бази даних для запуску без графічного середовища (cron, сервери)
+
+Приклади:
+    python -m cli enum shop status active inactive
+    python -m cli create shop users name:string age:integer status:enum:status --fts name
+    python -m cli import shop users users.csv --workers 4 --profile bulk_load
+    python -m cli export shop users users.jsonl.gz --format jsonl --compress
+    python -m cli intersect shop users admins --fields name
+    python -m cli stats shop users
+    python -m cli vacuum shop --analyze
+    python -m cli batch shop operations.jsonl
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+from database import Database, DataType, PERFORMANCE_PROFILES, decode_operation_arguments
+
+
+def _open_database(db_name: str, profile: str) -> Database:
+    """Підключення до бази та відновлення її схеми"""
+    db = Database(db_name, profile=profile)
+    if not db.connect():
+        raise RuntimeError(f"Cannot connect to database '{db_name}'")
+    if os.path.exists(db.schema_path):
+        db.load_from_disk(db.schema_path)
+    return db
+
+
+def _parse_fields(specs: list, fts_fields: list) -> dict:
+    """Розбір описів полів виду name:type[:enum_name]"""
+    fields = {}
+    for spec in specs:
+        parts = spec.split(':')
+        if len(parts) not in (2, 3):
+            raise ValueError(f"Invalid field definition: {spec}")
+        field_info = {'type': DataType(parts[1].lower())}
+        if field_info['type'] == DataType.ENUM:
+            if len(parts) != 3:
+                raise ValueError(f"Enum field '{parts[0]}' requires an enum name")
+            field_info['enum_name'] = parts[2]
+        fields[parts[0]] = field_info
+
+    for field_name in fts_fields:
+        if field_name not in fields:
+            raise ValueError(f"Full-text field '{field_name}' is not defined")
+        fields[field_name]['fts'] = True
+    return fields
+
+
+def _batch_operations(path: str):
+    """Операції пакета з JSONL файлу; поля create_table перетворюються на типи бази"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                operation = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {line_no}: {e}")
+
+            operation['args'], operation['kwargs'] = decode_operation_arguments(
+                operation.get('op'), operation.get('args', []), operation.get('kwargs', {}))
+            yield operation
+
+
+def _run(args: argparse.Namespace):
+    """Виконання підкоманди; повертає результат для виводу у JSON"""
+    db = _open_database(args.database, args.profile)
+    try:
+        if args.command == 'enum':
+            result = db.define_enum(args.name, args.values)
+        elif args.command == 'create':
+            result = db.create_table(args.table, _parse_fields(args.fields, args.fts or []),
+                                     shards=args.shards, shard_key=args.shard_key)
+        elif args.command == 'import':
+            result = db.import_file(args.table, args.path, format=args.format, batch_size=args.batch_size,
+                                    workers=args.workers)
+        elif args.command == 'export':
+            result = {'exported': db.export_table(args.source, args.path, format=args.format,
+                                                  batch_size=args.batch_size, compress=args.compress)}
+        elif args.command == 'intersect':
+            result = db.intersect_tables(args.left, args.right, args.fields.split(','),
+                                         as_view=args.view, maintained=args.maintained,
+                                         memory_limit=args.memory_limit)
+        elif args.command == 'stats':
+            result = db.table_stats(args.table)
+        elif args.command == 'vacuum':
+            result = db.incremental_vacuum() if args.incremental else db.vacuum()
+            if args.analyze:
+                db.analyze()
+        else:
+            result = db.execute_batch(_batch_operations(args.path))
+
+        if args.command in ('enum', 'create', 'intersect', 'batch'):
+            db.save_to_disk(db.schema_path)
+        return result
+    finally:
+        db.disconnect()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Опис підкоманд і їх аргументів"""
+    parser = argparse.ArgumentParser(prog='python -m cli', description="Операції з базою даних без GUI")
+    parser.add_argument('--profile', choices=list(PERFORMANCE_PROFILES), default='durable',
+                        help="профіль продуктивності SQLite")
+    parser.add_argument('--verbose', action='store_true', help="виводити журнал операцій у stderr")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('enum', help="визначення перелічуваного типу")
+    command.add_argument('database')
+    command.add_argument('name')
+    command.add_argument('values', nargs='+')
+
+    command = commands.add_parser('create', help="створення таблиці")
+    command.add_argument('database')
+    command.add_argument('table')
+    command.add_argument('fields', nargs='+', help="поля виду name:type[:enum_name]")
+    command.add_argument('--fts', action='append', help="поле з повнотекстовим індексом")
+    command.add_argument('--shards', type=int)
+    command.add_argument('--shard-key')
+
+    command = commands.add_parser('import', help="імпорт CSV/JSONL файлу")
+    command.add_argument('database')
+    command.add_argument('table')
+    command.add_argument('path')
+    command.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    command.add_argument('--batch-size', type=int, default=5000)
+    command.add_argument('--workers', type=int)
+
+    command = commands.add_parser('export', help="експорт таблиці у файл")
+    command.add_argument('database')
+    command.add_argument('source')
+    command.add_argument('path')
+    command.add_argument('--format', choices=['csv', 'jsonl', 'columnar'], default='csv')
+    command.add_argument('--batch-size', type=int, default=5000)
+    command.add_argument('--compress', action='store_true')
+
+    command = commands.add_parser('intersect', help="перетин двох таблиць")
+    command.add_argument('database')
+    command.add_argument('left')
+    command.add_argument('right')
+    command.add_argument('--fields', required=True, help="спільні поля через кому")
+    command.add_argument('--view', action='store_true')
+    command.add_argument('--maintained', action='store_true')
+    command.add_argument('--memory-limit', type=int)
+
+    command = commands.add_parser('stats', help="статистика таблиці")
+    command.add_argument('database')
+    command.add_argument('table')
+
+    command = commands.add_parser('vacuum', help="повернення вільного місця у файлі бази")
+    command.add_argument('database')
+    command.add_argument('--incremental', action='store_true')
+    command.add_argument('--analyze', action='store_true')
+
+    command = commands.add_parser('batch', help="виконання JSONL файлу операцій однією транзакцією")
+    command.add_argument('database')
+    command.add_argument('path')
+    return parser
+
+
+def main(argv=None) -> int:
+    """Точка входу: результат друкується у stdout як JSON, журнал операцій - лише з --verbose у stderr"""
+    args = build_parser().parse_args(argv)
+    log = sys.stderr if args.verbose else open(os.devnull, 'w', encoding='utf-8')
+    try:
+        with contextlib.redirect_stdout(log):
+            result = _run(args)
+    except Exception as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        if log is not sys.stderr:
+            log.close()
+
+    print(json.dumps(result, ensure_ascii=False, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,8 +2,175 @@ import sqlite3
 import json
 import re
 import os
+import csv
+import gzip
+import io
+import mmap
+import math
+import pickle
+import struct
+import sys
+import tempfile
+import zlib
+import hashlib
+import heapq
+import queue
+import threading
+import time
+import concurrent.futures
+import copy
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from enum import Enum
-from typing import List, Dict, Any
+from itertools import islice, chain
+from typing import List, Dict, Any, Optional, Iterable, Union, Callable
+
+
+SNAPSHOT_MAGIC = b'TDBSNAP1'
+SEGMENT_MAGIC = b'TDBSEG01'
+
+# Кодування колонок у блоках знімка
+COLUMN_TEXT = 0
+COLUMN_INT = 1
+COLUMN_INT_TEXT = 2
+COLUMN_REAL_TEXT = 3
+
+SET_OPERATIONS = ('union', 'intersect', 'difference', 'semi_join', 'anti_join')
+SET_OPERATORS_SQL = {'union': 'UNION', 'intersect': 'INTERSECT', 'difference': 'EXCEPT'}
+GRACE_MIN_PARTITIONS = 8
+AGGREGATE_FUNCTIONS = ('COUNT', 'SUM', 'MIN', 'MAX', 'AVG')
+# Профілі продуктивності: компроміс між надійністю запису та пропускною здатністю
+PERFORMANCE_PROFILES = {
+    'durable': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'cache_size': -2000,
+                'mmap_size': 0, 'temp_store': 'DEFAULT', 'page_size': 4096},
+    'balanced': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -65536,
+                 'mmap_size': 256 * 1024 * 1024, 'temp_store': 'MEMORY', 'page_size': 4096},
+    'bulk_load': {'journal_mode': 'MEMORY', 'synchronous': 'OFF', 'cache_size': -262144,
+                  'mmap_size': 1024 * 1024 * 1024, 'temp_store': 'MEMORY', 'page_size': 65536},
+}
+SQL_VARIABLE_CHUNK = 500
+EMPTY_ENUM_CODE = 0
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+HLL_PRECISION = 12
+CHANGE_LOG_TABLE = '__changes'
+MAINTENANCE_TASKS = ('vacuum', 'incremental_vacuum', 'analyze', 'optimize')
+FTS_TOKENIZERS = ('unicode61', 'porter', 'trigram')
+WRITER_OPERATIONS = ('add_row', 'add_rows', 'update_row', 'delete_row', 'update_rows', 'delete_rows',
+                     'create_table', 'define_enum', 'import_file', 'truncate_table', 'delete_table',
+                     'intersect_tables', 'intersect_many')
+BATCH_OPERATIONS = WRITER_OPERATIONS
+
+
+def _key_partition(key: tuple, partitions: int) -> int:
+    """Стабільний між процесами номер розділу для ключа"""
+    return zlib.crc32(repr(key).encode('utf-8')) % partitions
+
+
+def _spill_key_range(db_path: str, table_name: str, key_fields: List[str], id_from: int, id_to: int,
+                     partitions: int, spill_dir: str, tag: str, batch_size: int = 5000) -> int:
+    """Читання власного діапазону id окремим з'єднанням лише для читання і розкладання ключів
+    у файли хеш-розділів; повертає кількість прочитаних рядків"""
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    files = [open(os.path.join(spill_dir, f"{tag}_{partition}.bin"), 'wb') for partition in range(partitions)]
+    try:
+        cursor = connection.execute(f"SELECT {', '.join(key_fields)} FROM {table_name} WHERE id BETWEEN ? AND ?",
+                                    (id_from, id_to))
+        rows_read = 0
+        buffers = [[] for _ in range(partitions)]
+        for row in cursor:
+            partition = _key_partition(row, partitions)
+            buffers[partition].append(row)
+            if len(buffers[partition]) >= batch_size:
+                pickle.dump(buffers[partition], files[partition], pickle.HIGHEST_PROTOCOL)
+                buffers[partition] = []
+            rows_read += 1
+        for partition, buffer in enumerate(buffers):
+            if buffer:
+                pickle.dump(buffer, files[partition], pickle.HIGHEST_PROTOCOL)
+        return rows_read
+    finally:
+        for f in files:
+            f.close()
+        connection.close()
+
+
+def _load_spilled_keys(spill_dir: str, tag: str, partition: int):
+    """Ключі одного розділу, скинуті процесом читання діапазону"""
+    with open(os.path.join(spill_dir, f"{tag}_{partition}.bin"), 'rb') as f:
+        while True:
+            try:
+                yield from pickle.load(f)
+            except EOFError:
+                return
+
+
+def _intersect_spilled_partition(spill_dir: str, build_tags: List[str], probe_tags: List[str],
+                                 partition: int) -> List[tuple]:
+    """Перетин одного хеш-розділу за файлами, скинутими на етапі читання діапазонів"""
+    build_keys = set()
+    for tag in build_tags:
+        build_keys.update(_load_spilled_keys(spill_dir, tag, partition))
+    if not build_keys:
+        return []
+    return list({key for tag in probe_tags for key in _load_spilled_keys(spill_dir, tag, partition)
+                 if key in build_keys})
+
+
+def _valid_field_value(field_type: 'DataType', value: Any, enum_values: Optional[Iterable[str]] = None) -> bool:
+    """Перевірка значення поля за типом (порожні значення допустимі для всіх типів)"""
+    if not value:
+        return True
+    try:
+        if field_type == DataType.INTEGER:
+            int(value)
+        elif field_type == DataType.REAL:
+            float(value)
+        elif field_type == DataType.CHAR:
+            return isinstance(value, str) and len(value) == 1
+        elif field_type == DataType.EMAIL:
+            return isinstance(value, str) and EMAIL_PATTERN.match(value) is not None
+        elif field_type == DataType.ENUM:
+            return enum_values is not None and value in enum_values
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def _validate_import_batch(fields: Dict[str, tuple], column_map: Dict[str, str], batch: List[tuple]):
+    """Валідація порції записів імпорту: рядки значень для вставки та відхилені записи.
+
+    Працює без з'єднання з базою, тому може виконуватись в окремому процесі.
+    """
+    field_names = list(fields.keys())
+    valid_values = []
+    rejects = []
+    for line_no, record in batch:
+        data = {}
+        if isinstance(record, dict):
+            data = {column_map.get(key, key): value for key, value in record.items()}
+            data = {key: value for key, value in data.items() if key in fields}
+        if data and all(_valid_field_value(fields[key][0], value, fields[key][1]) for key, value in data.items()):
+            valid_values.append([None if data.get(field) is None else str(data[field]) for field in field_names])
+        else:
+            rejects.append((line_no, record))
+    return valid_values, rejects
+
+
+def _serialized_write(method):
+    """Операція запису через спільне з'єднання: виконується під блокуванням з'єднання.
+
+    Поки працює потік-записувач, прямі виклики з інших потоків відхиляються: їх фіксація
+    зруйнувала б точки збереження групи записувача.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        writer = self._writer_thread
+        if writer and threading.get_ident() != writer.ident:
+            raise ValueError(f"Direct '{method.__name__}' is not allowed while the writer is running, use submit()")
+        with self._connection_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class DataType(Enum):
@@ -15,22 +182,131 @@ class DataType(Enum):
     EMAIL = "email"
 
 
+def decode_operation_arguments(operation: str, args: List[Any], kwargs: Dict[str, Any]):
+    """Перетворення аргументів операції з JSON (сервер, пакети CLI): типи полів create_table стають DataType"""
+    def decode_fields(fields):
+        return {name: dict(info, type=DataType(info['type'])) for name, info in fields.items()}
+
+    args, kwargs = list(args), dict(kwargs)
+    if operation == 'create_table':
+        if len(args) > 1:
+            args[1] = decode_fields(args[1])
+        elif 'fields' in kwargs:
+            kwargs['fields'] = decode_fields(kwargs['fields'])
+    return args, kwargs
+
+
+class HyperLogLog:
+    """Скетч HyperLogLog для оцінки кількості різних значень у фіксованому обсязі пам'яті"""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: Any):
+        """Врахування значення (NULL не рахується)"""
+        if value is None:
+            return
+        hashed = int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        """Оцінка кількості різних значень (з поправкою лінійного підрахунку для малих множин)"""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+
 class Database:
-    def __init__(self, name: str):
+    def __init__(self, name: str, in_memory: bool = False, shared_cache: bool = False, profile: str = 'durable'):
+        if profile not in PERFORMANCE_PROFILES:
+            raise ValueError(f"Unknown performance profile: {profile}")
+
         self.name = name
+        self.in_memory = in_memory
+        self.shared_cache = shared_cache
+        self.profile = profile
         self.connection = None
         self.tables = []
         self.enum_definitions = {}
 
-    def connect(self):
-        """Підключення до бази даних"""
+        # Відстеження змін для інкрементального збереження
+        self._snapshot_path = None
+        self._dirty_enums = set()
+        self._dirty_tables = set()
+        self._dirty_rows = {}
+        self._dropped_tables = set()
+
+        # Журнал змін для реплікації (вмикається enable_change_log, стан зберігається у файлі бази)
+        self._change_log = False
+
+        # Каталог статистики: кількість рядків і скетчі різних значень полів (будується ліниво)
+        self._stats = {}
+
+        # Наступні вільні id у кожному шарді шардованих таблиць
+        self._shard_next_ids = {}
+
+        # Словникове кодування переліків: значення -> код (чинні значення) та код -> значення (усі коди)
+        self._enum_codes = {}
+        self._enum_values = {}
+
+        # Блокування спільного з'єднання для операцій запису, групи записувача та обслуговування
+        self._connection_lock = threading.RLock()
+
+        # Потік-записувач з груповою фіксацією транзакцій
+        self._writer_queue = None
+        self._writer_thread = None
+        self._group_commit_thread_id = None
+
+        # Планувальник обслуговування, що працює під час простою
+        self._last_activity = time.monotonic()
+        self._maintenance_thread = None
+        self._maintenance_stop = None
+
+    def connect(self, profile: Optional[str] = None):
+        """Підключення до бази даних (з профілем продуктивності, за замовчуванням - профілем об'єкта)"""
+        if profile is not None and profile not in PERFORMANCE_PROFILES:
+            raise ValueError(f"Unknown performance profile: {profile}")
+
         try:
             if not os.path.exists('databases'):
                 os.makedirs('databases')
 
-            db_path = f"databases/{self.name}.db"
-            self.connection = sqlite3.connect(db_path, check_same_thread=False)
+            db_path = self.file_path
+            if self.in_memory:
+                if self.shared_cache:
+                    self.connection = sqlite3.connect(f"file:{self.name}?mode=memory&cache=shared",
+                                                      uri=True, check_same_thread=False)
+                else:
+                    self.connection = sqlite3.connect(":memory:", check_same_thread=False)
+
+                # Початкове завантаження файлу бази даних у пам'ять
+                if os.path.exists(db_path):
+                    source = sqlite3.connect(db_path)
+                    try:
+                        source.backup(self.connection)
+                    finally:
+                        source.close()
+                db_path = f"{db_path} (у пам'яті)"
+            else:
+                self.connection = sqlite3.connect(db_path, check_same_thread=False)
             self.connection.row_factory = sqlite3.Row
+            self._apply_profile(profile or self.profile)
+            self._change_log = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CHANGE_LOG_TABLE,)).fetchone() is not None
+            self._restore_shards()
+            for enum_name in self.enum_definitions:
+                self._sync_enum_codes(enum_name)
 
             print(f"✅ Підключено до бази даних: {db_path}")
             return True
@@ -40,10 +316,352 @@ class Database:
 
     def disconnect(self):
         """Відключення від бази даних"""
+        if self._writer_thread:
+            self.stop_writer()
+        if self._maintenance_thread:
+            self.stop_maintenance()
         if self.connection:
             self.connection.close()
             print("✅ Відключено від бази даних")
 
+    def set_profile(self, profile: str) -> str:
+        """Перемикання профілю продуктивності під час роботи; повертає попередній профіль"""
+        if profile not in PERFORMANCE_PROFILES:
+            raise ValueError(f"Unknown performance profile: {profile}")
+        if not self.connection:
+            raise ValueError("Database not connected")
+        if self.connection.in_transaction:
+            raise ValueError("Cannot switch profile inside an open transaction")
+
+        previous = self.profile
+        self._apply_profile(profile)
+        print(f"⚙️ Профіль продуктивності змінено: {previous} -> {profile}")
+        return previous
+
+    def get_pragmas(self, schema: str = 'main') -> Dict[str, Any]:
+        """Фактичні значення налаштувань, якими керують профілі"""
+        if not self.connection:
+            raise ValueError("Database not connected")
+
+        settings = {}
+        for pragma in PERFORMANCE_PROFILES[self.profile]:
+            prefix = '' if pragma == 'temp_store' else f"{schema}."
+            row = self.connection.execute(f"PRAGMA {prefix}{pragma}").fetchone()
+            settings[pragma] = row[0] if row else None
+        return settings
+
+    def _apply_profile(self, profile: str, schemas: Optional[List[str]] = None):
+        """Застосування профілю до основної бази та приєднаних шардів.
+
+        page_size діє лише для ще порожніх файлів; наявні файли зберігають свій розмір сторінки.
+        """
+        settings = PERFORMANCE_PROFILES[profile]
+        cursor = self.connection.cursor()
+        if schemas is None:
+            cursor.execute("PRAGMA database_list")
+            schemas = [row[1] for row in cursor.fetchall() if row[1] != 'temp']
+
+        for schema in schemas:
+            cursor.execute(f"PRAGMA {schema}.page_size = {int(settings['page_size'])}")
+            cursor.execute(f"PRAGMA {schema}.journal_mode = {settings['journal_mode']}")
+            cursor.execute(f"PRAGMA {schema}.synchronous = {settings['synchronous']}")
+            cursor.execute(f"PRAGMA {schema}.cache_size = {int(settings['cache_size'])}")
+            cursor.execute(f"PRAGMA {schema}.mmap_size = {int(settings['mmap_size'])}")
+        cursor.execute(f"PRAGMA temp_store = {settings['temp_store']}")
+        self.profile = profile
+
+    @_serialized_write
+    def vacuum(self) -> Dict[str, int]:
+        """Повне перепакування файлів бази (основного та шардів) з поверненням вільних сторінок"""
+        return self._run_maintenance('VACUUM', lambda cursor, schema: cursor.execute(f"VACUUM {schema}"))
+
+    @_serialized_write
+    def incremental_vacuum(self, pages: Optional[int] = None) -> Dict[str, int]:
+        """Повернення вільних сторінок без повного перепакування (за потреби вмикає auto_vacuum)"""
+        if pages is not None and pages <= 0:
+            raise ValueError("Page count must be positive")
+
+        def step(cursor, schema):
+            cursor.execute(f"PRAGMA {schema}.auto_vacuum")
+            if cursor.fetchone()[0] != 2:
+                # Режим INCREMENTAL набуває чинності лише після повного перепакування
+                cursor.execute(f"PRAGMA {schema}.auto_vacuum = INCREMENTAL")
+                cursor.execute(f"VACUUM {schema}")
+            # Без кількості сторінок повертаються всі вільні сторінки
+            cursor.execute(f"PRAGMA {schema}.incremental_vacuum({int(pages) if pages else 0})").fetchall()
+
+        return self._run_maintenance('incremental VACUUM', step)
+
+    @_serialized_write
+    def analyze(self, table_name: Optional[str] = None) -> Dict[str, int]:
+        """Оновлення статистики планувальника запитів (для всієї бази або однієї таблиці)"""
+        if table_name is None:
+            return self._run_maintenance('ANALYZE', lambda cursor, schema: cursor.execute(f"ANALYZE {schema}"))
+
+        table_info = self._get_table_info(table_name)
+        if not table_info:
+            raise ValueError(f"Table '{table_name}' not found")
+        targets = {(target.split('.')[0] if '.' in target else 'main'): target
+                   for target in self._physical_tables(table_info)}
+        return self._run_maintenance('ANALYZE', lambda cursor, schema: cursor.execute(f"ANALYZE {targets[schema]}")
+                                     if schema in targets else None)
+
+    @_serialized_write
+    def optimize(self) -> Dict[str, int]:
+        """Легке обслуговування: PRAGMA optimize оновлює статистику лише там, де вона застаріла"""
+        return self._run_maintenance('PRAGMA optimize',
+                                     lambda cursor, schema: cursor.execute(f"PRAGMA {schema}.optimize").fetchall())
+
+    def _run_maintenance(self, title: str, step: Callable[[sqlite3.Cursor, str], Any]) -> Dict[str, int]:
+        """Виконання кроку обслуговування для кожного файлу бази зі звітом про розмір до і після"""
+        if not self.connection:
+            raise ValueError("Database not connected")
+        if self.connection.in_transaction:
+            raise ValueError("Maintenance cannot run inside an open transaction")
+
+        cursor = self.connection.cursor()
+        before = self._storage_size()
+        started = time.perf_counter()
+        try:
+            cursor.execute("PRAGMA database_list")
+            for schema in [row[1] for row in cursor.fetchall() if row[1] != 'temp']:
+                step(cursor, schema)
+            self._commit()
+        except sqlite3.Error as e:
+            print(f"❌ Помилка обслуговування ({title}): {e}")
+            self._rollback()
+            raise
+
+        after = self._storage_size()
+        print(f"🧹 {title}: {before} -> {after} байт за {time.perf_counter() - started:.2f} с")
+        return {'before': before, 'after': after}
+
+    def _storage_size(self) -> int:
+        """Сумарний розмір файлів бази та шардів (для бази в пам'яті - розмір сторінок)"""
+        cursor = self.connection.cursor()
+        cursor.execute("PRAGMA database_list")
+        total = 0
+        for _, schema, path in [tuple(row) for row in cursor.fetchall()]:
+            if schema == 'temp':
+                continue
+            if path and os.path.exists(path):
+                total += os.path.getsize(path)
+                if os.path.exists(f"{path}-wal"):
+                    total += os.path.getsize(f"{path}-wal")
+            else:
+                page_count = cursor.execute(f"PRAGMA {schema}.page_count").fetchone()[0]
+                total += page_count * cursor.execute(f"PRAGMA {schema}.page_size").fetchone()[0]
+        return total
+
+    def start_maintenance(self, interval: float = 300.0, idle_after: float = 60.0,
+                          tasks: Iterable[str] = ('optimize', 'incremental_vacuum')):
+        """Фоновий планувальник, що виконує обслуговування, коли база не змінювалась idle_after секунд"""
+        tasks = list(tasks)
+        unknown = [task for task in tasks if task not in MAINTENANCE_TASKS]
+        if unknown:
+            raise ValueError(f"Unknown maintenance tasks: {unknown}")
+        if interval <= 0 or idle_after < 0:
+            raise ValueError("Interval must be positive and idle time non-negative")
+        if not self.connection:
+            raise ValueError("Database not connected")
+        if self._maintenance_thread:
+            raise ValueError("Maintenance scheduler is already running")
+
+        self._maintenance_stop = threading.Event()
+        self._maintenance_thread = threading.Thread(
+            target=self._maintenance_loop, args=(interval, idle_after, tasks, self._maintenance_stop),
+            name=f"maintenance-{self.name}", daemon=True)
+        self._maintenance_thread.start()
+        print(f"🕒 Планувальник обслуговування запущено: {tasks} кожні {interval} с")
+
+    def stop_maintenance(self):
+        """Зупинка планувальника обслуговування"""
+        if not self._maintenance_thread:
+            return
+        self._maintenance_stop.set()
+        self._maintenance_thread.join()
+        self._maintenance_thread = None
+        self._maintenance_stop = None
+        print("🕒 Планувальник обслуговування зупинено")
+
+    def _maintenance_loop(self, interval: float, idle_after: float, tasks: List[str], stop: threading.Event):
+        """Цикл планувальника: запуск пропускається, поки база активна або відкрита транзакція"""
+        while not stop.wait(interval):
+            if time.monotonic() - self._last_activity < idle_after or self._writer_thread:
+                continue
+            # З'єднання, зайняте записом з іншого потоку, означає, що база не простоює
+            if not self._connection_lock.acquire(blocking=False):
+                continue
+            try:
+                if self.connection.in_transaction:
+                    continue
+                for task in tasks:
+                    try:
+                        getattr(self, task)()
+                    except (sqlite3.Error, ValueError) as e:
+                        print(f"⚠️ Обслуговування '{task}' пропущено: {e}")
+                        break
+            finally:
+                self._connection_lock.release()
+
+    def start_writer(self, batch_size: int = 500, flush_interval: float = 0.005):
+        """Запуск окремого потоку-записувача, що фіксує накопичені операції однією транзакцією"""
+        if not self.connection:
+            raise ValueError("Database not connected")
+        if self._writer_thread:
+            raise ValueError("Writer is already running")
+        if batch_size <= 0 or flush_interval < 0:
+            raise ValueError("Batch size must be positive and flush interval non-negative")
+
+        self._writer_queue = queue.Queue()
+        self._writer_thread = threading.Thread(target=self._writer_loop, args=(batch_size, flush_interval),
+                                               name=f"{self.name}-writer", daemon=True)
+        self._writer_thread.start()
+        print(f"✍️ Потік-записувач запущено (пакет до {batch_size} операцій, затримка {flush_interval} с)")
+        return True
+
+    def submit(self, operation: str, *args, **kwargs) -> Future:
+        """Постановка операції запису в чергу; повертає Future з результатом (наприклад, id рядка)"""
+        if operation not in WRITER_OPERATIONS:
+            raise ValueError(f"Unsupported writer operation: {operation}")
+        if not self._writer_thread:
+            raise ValueError("Writer is not running")
+
+        future = Future()
+        self._writer_queue.put((future, getattr(self, operation), args, kwargs))
+        return future
+
+    def stop_writer(self):
+        """Зупинка потоку-записувача після виконання всіх операцій у черзі"""
+        if not self._writer_thread:
+            return False
+
+        self._writer_queue.put(None)
+        self._writer_thread.join()
+        self._writer_thread = None
+        self._writer_queue = None
+        print("✍️ Потік-записувач зупинено")
+        return True
+
+    def _writer_loop(self, batch_size: int, flush_interval: float):
+        """Цикл потоку-записувача: збір групи операцій і одна фіксація на групу"""
+        stopping = False
+        while not stopping:
+            item = self._writer_queue.get()
+            if item is None:
+                break
+
+            group = [item]
+            deadline = time.monotonic() + flush_interval
+            while len(group) < batch_size:
+                try:
+                    item = self._writer_queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+
+            self._run_writer_group(group)
+
+    def _run_writer_group(self, group):
+        """Виконання групи операцій у спільній транзакції (кожна - у власній точці збереження)"""
+        outcomes = []
+        self._connection_lock.acquire()
+        self._group_commit_thread_id = threading.get_ident()
+        try:
+            if not self.connection.in_transaction:
+                self.connection.execute("BEGIN")
+
+            for future, method, args, kwargs in group:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.connection.execute("SAVEPOINT writer_operation")
+                try:
+                    result = method(*args, **kwargs)
+                    self.connection.execute("RELEASE writer_operation")
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    # Невдала операція відкочується окремо, не зачіпаючи решту групи
+                    self.connection.execute("ROLLBACK TO writer_operation")
+                    self.connection.execute("RELEASE writer_operation")
+                    outcomes.append((future, None, e))
+
+            self.connection.commit()
+
+        except Exception as e:
+            print(f"❌ Помилка групової фіксації: {e}")
+            try:
+                self.connection.rollback()
+            except sqlite3.Error as rollback_error:
+                print(f"❌ Помилка відкату групи: {rollback_error}")
+            outcomes = [(future, None, error or e) for future, _, error in outcomes]
+            # Операція, на якій стався збій, і ще не виконані операції групи завершуються тією ж помилкою
+            resolved = {id(future) for future, _, _ in outcomes}
+            outcomes += [(future, None, e) for future, _, _, _ in group
+                         if id(future) not in resolved
+                         and (future.running() or (not future.done() and future.set_running_or_notify_cancel()))]
+        finally:
+            self._group_commit_thread_id = None
+            self._connection_lock.release()
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _commit(self):
+        """Фіксація транзакції (у потоці-записувачі відкладається до кінця групи)"""
+        self._last_activity = time.monotonic()
+        if self._group_commit_thread_id != threading.get_ident():
+            self.connection.commit()
+
+    def _rollback(self):
+        """Відкат транзакції (у потоці-записувачі відкочується лише точка збереження операції)"""
+        if self._group_commit_thread_id != threading.get_ident():
+            self.connection.rollback()
+
+    @property
+    def file_path(self) -> str:
+        """Шлях до файлу бази даних на диску"""
+        return f"databases/{self.name}.db"
+
+    @property
+    def schema_path(self) -> str:
+        """Шлях до JSON-опису схеми, що зберігається поруч із файлом бази між запусками"""
+        return f"databases/{self.name}.schema.json"
+
+    def backup(self, path: Optional[str] = None, pages: int = 1024,
+               progress: Optional[Callable[[int, int, int], None]] = None):
+        """Онлайн-резервування бази даних у файл посторінково (SQLite backup API)"""
+        if not self.connection:
+            raise ValueError("Database not connected")
+
+        path = path or self.file_path
+        if not self.in_memory and os.path.abspath(path) == os.path.abspath(self.file_path):
+            raise ValueError("Backup target must differ from the database file")
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        try:
+            target = sqlite3.connect(path)
+            try:
+                self.connection.backup(target, pages=pages, progress=progress)
+            finally:
+                target.close()
+
+            print(f"💾 Резервну копію бази даних записано у файл: {path}")
+            return True
+
+        except sqlite3.Error as e:
+            print(f"❌ Помилка резервного копіювання: {e}")
+            raise
+
+    @_serialized_write
     def define_enum(self, enum_name: str, values: List[str]):
         """Визначення перелічуваного типу"""
         if not enum_name or not values:
@@ -51,56 +669,250 @@ class Database:
 
         cleaned_values = [str(value).strip() for value in values if str(value).strip()]
         self.enum_definitions[enum_name] = cleaned_values
+        self._sync_enum_codes(enum_name)
+        if self._change_log:
+            self._log_change(enum_name, 'define_enum', cleaned_values)
+            self._commit()
+        self._dirty_enums.add(enum_name)
         print(f"✅ Перелічуваний тип '{enum_name}' визначено: {cleaned_values}")
         return True
 
-    def create_table(self, table_name: str, fields: Dict[str, Dict]):
-        """Створення таблиці"""
+    def _sync_enum_codes(self, enum_name: str, known_codes: Optional[Dict[str, int]] = None):
+        """Узгодження кодів переліку з таблицею-довідником (наявні коди незмінні, нові значення - у кінець)"""
+        lookup = dict(known_codes or {})
+        lookup_table = f"enum_{enum_name}__codes"
+        cursor = self.connection.cursor() if self.connection else None
+
+        if cursor:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {lookup_table} "
+                           f"(code INTEGER PRIMARY KEY, value TEXT NOT NULL UNIQUE)")
+            if known_codes:
+                cursor.executemany(f"INSERT OR REPLACE INTO {lookup_table} (code, value) VALUES (?, ?)",
+                                   [(code, value) for value, code in known_codes.items()])
+            cursor.execute(f"SELECT value, code FROM {lookup_table}")
+            lookup.update({value: code for value, code in cursor.fetchall()})
+        else:
+            lookup.update({value: code for code, value in self._enum_values.get(enum_name, {}).items()})
+
+        next_code = max(lookup.values(), default=0) + 1
+        new_codes = []
+        for value in self.enum_definitions.get(enum_name, []):
+            if value not in lookup:
+                lookup[value] = next_code
+                new_codes.append((next_code, value))
+                next_code += 1
+
+        if cursor and (new_codes or known_codes):
+            cursor.executemany(f"INSERT INTO {lookup_table} (code, value) VALUES (?, ?)", new_codes)
+            self._commit()
+
+        self._enum_values[enum_name] = {code: value for value, code in lookup.items()}
+        self._enum_codes[enum_name] = {value: lookup[value] for value in self.enum_definitions.get(enum_name, [])}
+
+    def _enum_code_map(self, enum_name: str) -> Dict[str, int]:
+        """Повна відповідність значення -> код переліку, включно з вилученими значеннями"""
+        return {value: code for code, value in self._enum_values.get(enum_name, {}).items()}
+
+    def _encode_values(self, table_info: Dict[str, Any], columns: List[str], values: Iterable[Any]) -> List[Any]:
+        """Перетворення значень рядка у фізичний вигляд: коди для переліків, текст для решти полів"""
+        encoded = []
+        for column, value in zip(columns, values):
+            field_info = table_info['fields'].get(column, {})
+            if value is None:
+                encoded.append(None)
+            elif field_info.get('encoded'):
+                encoded.append(self._enum_code(field_info['enum_name'], value))
+            else:
+                encoded.append(str(value))
+        return encoded
+
+    def _enum_code(self, enum_name: str, value: Any) -> int:
+        """Код значення переліку; порожнє значення зберігається окремим кодом, а не NULL"""
+        if value == '':
+            return EMPTY_ENUM_CODE
+        code = self._enum_codes.get(enum_name, {}).get(str(value))
+        if code is None:
+            raise ValueError(f"Unknown value '{value}' for enum '{enum_name}'")
+        return code
+
+    def _row_decoder(self, table_info: Optional[Dict[str, Any]]) -> Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]:
+        """Функція декодування кодів переліків у рядку-словнику (None, якщо декодувати нічого)"""
+        if not table_info:
+            return None
+        mappings = {field: {EMPTY_ENUM_CODE: '', **self._enum_values.get(field_info['enum_name'], {})}
+                    for field, field_info in table_info['fields'].items() if field_info.get('encoded')}
+        if not mappings:
+            return None
+
+        def decode(row):
+            for field, mapping in mappings.items():
+                value = row.get(field)
+                if value is not None:
+                    row[field] = mapping.get(value, value)
+            return row
+
+        return decode
+
+    def _decode_rows(self, table_info: Optional[Dict[str, Any]], rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Декодування списку рядків-словників"""
+        decode = self._row_decoder(table_info)
+        return [decode(row) for row in rows] if decode else rows
+
+    @staticmethod
+    def _enum_signature(table_info: Optional[Dict[str, Any]], field: str) -> Optional[str]:
+        """Назва переліку, якщо поле зберігається кодами (для перевірки порівнюваності кодів)"""
+        field_info = table_info['fields'].get(field, {}) if table_info else {}
+        return field_info['enum_name'] if field_info.get('encoded') else None
+
+    @_serialized_write
+    def create_table(self, table_name: str, fields: Dict[str, Dict], shards: Optional[int] = None,
+                     shard_key: Optional[str] = None):
+        """Створення таблиці (звичайної або шардованої між кількома файлами)"""
         if not table_name or not fields:
             raise ValueError("Table name and fields cannot be empty")
 
         if not self.connection:
             raise ValueError("Database not connected")
 
+        if shards is not None:
+            if shards < 1:
+                raise ValueError("Shard count must be positive")
+            if self.in_memory:
+                raise ValueError("Sharded tables require an on-disk database")
+            if shard_key is not None and shard_key not in fields:
+                raise ValueError(f"Shard key '{shard_key}' is not a field of table '{table_name}'")
+
+        for field_name, field_info in fields.items():
+            if not field_info.get('fts'):
+                continue
+            if field_info['type'] not in (DataType.STRING, DataType.EMAIL):
+                raise ValueError(f"Full-text index is supported only for STRING and EMAIL fields, not '{field_name}'")
+            if shards is not None:
+                raise ValueError("Full-text index is not supported for sharded tables")
+            if self._fts_tokenizer(field_info) not in FTS_TOKENIZERS:
+                raise ValueError(f"Unsupported full-text tokenizer: {field_info['fts']}")
+
         cursor = self.connection.cursor()
 
         try:
+            # Переліки зберігаються цілими кодами, якщо поле явно не позначене інакше
+            fields = {field_name: dict(field_info) for field_name, field_info in fields.items()}
+            for field_info in fields.values():
+                if field_info['type'] == DataType.ENUM:
+                    field_info['encoded'] = field_info.get('encoded', True)
+                    if field_info['encoded'] and field_info.get('enum_name') in self.enum_definitions:
+                        self._sync_enum_codes(field_info['enum_name'])
+
             # Формування SQL запиту
             field_definitions = []
             for field_name, field_info in fields.items():
-                field_definitions.append(f"{field_name} TEXT")
-
-            create_query = f"CREATE TABLE IF NOT EXISTS {table_name} (id INTEGER PRIMARY KEY AUTOINCREMENT, {', '.join(field_definitions)})"
-            print(f"📝 Виконуємо запит: {create_query}")
-
-            cursor.execute(create_query)
-            self.connection.commit()
+                field_definitions.append(f"{field_name} {'INTEGER' if field_info.get('encoded') else 'TEXT'}")
 
             # Додавання інформації про таблицю
             table_info = {
                 'name': table_name,
                 'fields': fields
             }
+
+            if shards is None:
+                create_query = f"CREATE TABLE IF NOT EXISTS {table_name} (id INTEGER PRIMARY KEY AUTOINCREMENT, {', '.join(field_definitions)})"
+                print(f"📝 Виконуємо запит: {create_query}")
+                cursor.execute(create_query)
+                for field_name, field_info in fields.items():
+                    if field_info.get('fts'):
+                        self._install_fts_index(cursor, table_name, field_name, self._fts_tokenizer(field_info))
+            else:
+                # id розподіляються самою базою, тому в шардах AUTOINCREMENT не потрібен
+                table_info['sharded'] = {'shards': shards, 'key': shard_key}
+                self._attach_shards(shards)
+                for shard in range(shards):
+                    create_query = (f"CREATE TABLE IF NOT EXISTS shard{shard}.{table_name} "
+                                    f"(id INTEGER PRIMARY KEY, {', '.join(field_definitions)})")
+                    print(f"📝 Виконуємо запит: {create_query}")
+                    cursor.execute(create_query)
+                self._create_shard_view(table_info)
+
+            if self._change_log:
+                self._install_change_triggers(table_info)
+                self._log_change(table_name, 'create_table', table_info)
+            self._commit()
             self.tables.append(table_info)
+            self._stats.pop(table_name, None)
+            self._mark_dirty(table_name)
 
             print(f"✅ Таблицю '{table_name}' створено успішно")
             return True
 
         except sqlite3.Error as e:
             print(f"❌ SQLite помилка: {e}")
-            self.connection.rollback()
+            self._rollback()
             raise Exception(f"Помилка бази даних: {e}")
 
+    @staticmethod
+    def _fts_tokenizer(field_info: Dict[str, Any]) -> str:
+        """Назва токенізатора повнотекстового індексу поля (True - типовий unicode61)"""
+        return 'unicode61' if field_info['fts'] is True else str(field_info['fts'])
+
+    @staticmethod
+    def _install_fts_index(cursor: sqlite3.Cursor, table_name: str, field_name: str, tokenizer: str):
+        """Індекс FTS5 над полем таблиці та тригери, що синхронізують його з рядками"""
+        fts_table = f"{table_name}__fts_{field_name}"
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({field_name}, "
+                       f"content='{table_name}', content_rowid='id', tokenize='{tokenizer}')")
+
+        add_entry = f"INSERT INTO {fts_table} (rowid, {field_name}) VALUES (NEW.id, NEW.{field_name}); "
+        remove_entry = (f"INSERT INTO {fts_table} ({fts_table}, rowid, {field_name}) "
+                        f"VALUES ('delete', OLD.id, OLD.{field_name}); ")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {fts_table}_insert "
+                       f"AFTER INSERT ON {table_name} BEGIN {add_entry} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {fts_table}_delete "
+                       f"AFTER DELETE ON {table_name} BEGIN {remove_entry} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {fts_table}_update "
+                       f"AFTER UPDATE OF {field_name} ON {table_name} BEGIN {remove_entry}{add_entry} END")
+        # Перебудова підхоплює рядки, що вже є в таблиці
+        cursor.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+
+    def search(self, table_name: str, field: str, query: str, limit: int = 20, raw: bool = False):
+        """Повнотекстовий пошук по індексованому полю з упорядкуванням за релевантністю (bm25)"""
+        table_info = self._get_table_info(table_name)
+        if not table_info:
+            raise ValueError(f"Table '{table_name}' not found")
+        if not table_info['fields'].get(field, {}).get('fts'):
+            raise ValueError(f"Field '{field}' of table '{table_name}' has no full-text index")
+        if limit <= 0:
+            raise ValueError("Limit must be positive")
+
+        if not raw:
+            # Кожне слово шукається як окрема фраза, тож службові символи FTS5 не впливають на запит
+            query = ' '.join('"' + word.replace('"', '""') + '"' for word in str(query).split())
+        if not query:
+            return []
+
+        fts_table = f"{table_name}__fts_{field}"
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"SELECT {table_name}.* FROM {fts_table} "
+                           f"JOIN {table_name} ON {table_name}.id = {fts_table}.rowid "
+                           f"WHERE {fts_table} MATCH ? ORDER BY {fts_table}.rank LIMIT ?", (query, limit))
+            columns = [description[0] for description in cursor.description]
+            rows = self._decode_rows(table_info, [dict(zip(columns, row)) for row in cursor.fetchall()])
+            print(f"🔎 Знайдено {len(rows)} рядків у '{table_name}.{field}' за запитом: {query}")
+            return rows
+
+        except sqlite3.Error as e:
+            print(f"❌ Помилка пошуку: {e}")
+            raise
+
     def get_row_by_id(self, table_name: str, row_id: int):
         """Отримання конкретного рядка за ID"""
         cursor = self.connection.cursor()
         try:
-            cursor.execute(f"SELECT * FROM {table_name} WHERE id = ?", (row_id,))
+            cursor.execute(f"SELECT * FROM {self._table_for_row(table_name, row_id)} WHERE id = ?", (row_id,))
             row = cursor.fetchone()
 
             if row:
                 columns = [description[0] for description in cursor.description]
-                row_dict = dict(zip(columns, row))
+                row_dict = self._decode_rows(self._get_table_info(table_name), [dict(zip(columns, row))])[0]
                 print(f"✅ Отримано рядок з ID {row_id} з таблиці '{table_name}'")
                 return row_dict
             else:
@@ -111,8 +923,35 @@ class Database:
             print(f"❌ Помилка отримання рядка: {e}")
             return None
 
+    def get_rows_by_ids(self, table_name: str, ids: Iterable[int]):
+        """Пакетне отримання рядків за списком id; повертає рядки за id та відсутні id"""
+        table_info = self._get_table_info(table_name)
+        if not table_info:
+            raise ValueError(f"Table '{table_name}' not found")
+
+        ids = list(dict.fromkeys(int(row_id) for row_id in ids))
+        cursor = self.connection.cursor()
+        try:
+            rows = {}
+            for physical_table, chunk in self._id_chunks(table_name, ids):
+                cursor.execute(f"SELECT * FROM {physical_table} WHERE id IN ({', '.join('?' for _ in chunk)})", chunk)
+                columns = [description[0] for description in cursor.description]
+                for row in self._decode_rows(table_info, [dict(zip(columns, row)) for row in cursor.fetchall()]):
+                    rows[row['id']] = row
+
+            missing = [row_id for row_id in ids if row_id not in rows]
+            print(f"✅ Отримано {len(rows)} рядків з таблиці '{table_name}'"
+                  + (f", не знайдено id: {missing}" if missing else ""))
+            return {'rows': rows, 'missing': missing}
+
+        except sqlite3.Error as e:
+            print(f"❌ Помилка отримання рядків: {e}")
+            raise
+
+    @_serialized_write
     def add_row(self, table_name: str, data: Dict[str, Any]):
         """Додавання рядка"""
+        self._ensure_writable(table_name)
         if not self._validate_row_data(table_name, data):
             raise ValueError("Invalid data for table")
 
@@ -121,25 +960,61 @@ class Database:
         try:
             columns = ', '.join(data.keys())
             placeholders = ', '.join(['?' for _ in data])
-            values = [str(value) for value in data.values()]
+            table_info = self._get_table_info(table_name)
+            values = self._encode_values(table_info, list(data.keys()), data.values())
 
-            insert_query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-            cursor.execute(insert_query, values)
-            self.connection.commit()
+            if table_info.get('sharded'):
+                row_id = self._insert_sharded(table_info, list(data.keys()), [values])[0]
+            else:
+                insert_query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+                cursor.execute(insert_query, values)
+                row_id = cursor.lastrowid
+            self._commit()
 
-            row_id = cursor.lastrowid
+            self._stats_record_insert(table_name, list(data.keys()), [values])
+            self._mark_dirty(table_name, [row_id])
             print(f"✅ Рядок додано успішно (ID: {row_id})")
             return row_id
 
         except sqlite3.Error as e:
             print(f"❌ Помилка додавання рядка: {e}")
-            self.connection.rollback()
+            self._rollback()
             raise
 
+    @_serialized_write
+    def add_rows(self, table_name: str, rows: Iterable[Dict[str, Any]]) -> int:
+        """Пакетне додавання рядків з перевіркою кожного; повертає кількість доданих рядків"""
+        self._ensure_writable(table_name)
+        table_info = self._get_table_info(table_name)
+        if not table_info:
+            raise ValueError(f"Table '{table_name}' not found")
+
+        field_names = list(table_info['fields'].keys())
+        values = []
+        for index, data in enumerate(rows):
+            if not self._validate_row_data(table_name, data):
+                raise ValueError(f"Invalid data for table in row #{index}")
+            values.append([data.get(field) for field in field_names])
+
+        inserted = self._bulk_insert(table_name, field_names, values) if values else 0
+        print(f"✅ Додано {inserted} рядків у таблицю '{table_name}'")
+        return inserted
+
     def get_rows(self, table_name: str):
         """Отримання всіх рядків таблиці"""
         cursor = self.connection.cursor()
         try:
+            table_info = self._get_table_info(table_name)
+            if table_info and table_info.get('sharded'):
+                # Паралельне читання всіх шардів і злиття за id
+                shard_results = self._fan_out(table_info, f"SELECT * FROM {table_name} ORDER BY id")
+                result = self._decode_rows(table_info, list(heapq.merge(
+                    *[[dict(zip(columns, row)) for row in rows] for columns, rows in shard_results],
+                    key=lambda row: row['id']
+                )))
+                print(f"✅ Отримано {len(result)} рядків з таблиці '{table_name}'")
+                return result
+
             cursor.execute(f"SELECT * FROM {table_name}")
             columns = [description[0] for description in cursor.description]
             rows = cursor.fetchall()
@@ -148,6 +1023,7 @@ class Database:
             for row in rows:
                 row_dict = dict(zip(columns, row))
                 result.append(row_dict)
+            result = self._decode_rows(table_info, result)
 
             print(f"✅ Отримано {len(result)} рядків з таблиці '{table_name}'")
             return result
@@ -156,8 +1032,10 @@ class Database:
             print(f"❌ Помилка отримання даних: {e}")
             return []
 
+    @_serialized_write
     def update_row(self, table_name: str, row_id: int, data: Dict[str, Any]):
         """Редагування рядка"""
+        self._ensure_writable(table_name)
         if not self._validate_row_data(table_name, data):
             raise ValueError("Invalid data for table")
 
@@ -165,16 +1043,18 @@ class Database:
 
         try:
             set_clause = ', '.join([f"{key} = ?" for key in data.keys()])
-            values = [str(value) for value in data.values()]
+            values = self._encode_values(self._get_table_info(table_name), list(data.keys()), data.values())
             values.append(row_id)
 
-            update_query = f"UPDATE {table_name} SET {set_clause} WHERE id = ?"
+            update_query = f"UPDATE {self._table_for_row(table_name, row_id)} SET {set_clause} WHERE id = ?"
             print(f"🔄 Оновлюємо рядок: {update_query} з значеннями: {values}")
             cursor.execute(update_query, values)
-            self.connection.commit()
+            self._commit()
 
             success = cursor.rowcount > 0
             if success:
+                self._stats_record_update(table_name, list(data.keys()), values[:-1])
+                self._mark_dirty(table_name, [row_id])
                 print(f"✅ Рядок з ID {row_id} оновлено")
             else:
                 print(f"❌ Рядок з ID {row_id} не знайдено для оновлення")
@@ -182,18 +1062,22 @@ class Database:
 
         except sqlite3.Error as e:
             print(f"❌ Помилка оновлення рядка: {e}")
-            self.connection.rollback()
+            self._rollback()
             raise
 
+    @_serialized_write
     def delete_row(self, table_name: str, row_id: int):
         """Видалення рядка"""
+        self._ensure_writable(table_name)
         cursor = self.connection.cursor()
         try:
-            cursor.execute(f"DELETE FROM {table_name} WHERE id = ?", (row_id,))
-            self.connection.commit()
+            cursor.execute(f"DELETE FROM {self._table_for_row(table_name, row_id)} WHERE id = ?", (row_id,))
+            self._commit()
 
             success = cursor.rowcount > 0
             if success:
+                self._stats_record_delete(table_name, 1)
+                self._mark_dirty(table_name, [row_id])
                 print(f"✅ Рядок з ID {row_id} видалено")
             else:
                 print(f"❌ Рядок з ID {row_id} не знайдено для видалення")
@@ -201,21 +1085,808 @@ class Database:
 
         except sqlite3.Error as e:
             print(f"❌ Помилка видалення рядка: {e}")
+            self._rollback()
+            raise
+
+    @_serialized_write
+    def update_rows(self, table_name: str, changes: Dict[str, Any], where: Optional[Dict[str, Any]] = None,
+                    ids: Optional[Iterable[int]] = None) -> int:
+        """Пакетне оновлення рядків за умовою або списком id; повертає кількість змінених рядків"""
+        self._ensure_writable(table_name)
+        if not changes:
+            raise ValueError("Changes cannot be empty")
+        if not self._validate_row_data(table_name, changes):
+            raise ValueError("Invalid data for table")
+
+        table_info = self._get_table_info(table_name)
+        set_clause = ', '.join(f"{key} = ?" for key in changes)
+        values = self._encode_values(table_info, list(changes.keys()), changes.values())
+        changed = self._execute_for_rows(table_info, f"UPDATE {{table}} SET {set_clause}", values, where, ids)
+        if changed:
+            self._stats_record_update(table_name, list(changes.keys()), values)
+        print(f"✅ Оновлено {changed} рядків у таблиці '{table_name}'")
+        return changed
+
+    @_serialized_write
+    def delete_rows(self, table_name: str, where: Optional[Dict[str, Any]] = None,
+                    ids: Optional[Iterable[int]] = None) -> int:
+        """Пакетне видалення рядків за умовою або списком id; повертає кількість видалених рядків"""
+        self._ensure_writable(table_name)
+        table_info = self._get_table_info(table_name)
+        if not table_info:
+            raise ValueError(f"Table '{table_name}' not found")
+
+        deleted = self._execute_for_rows(table_info, "DELETE FROM {table}", [], where, ids)
+        self._stats_record_delete(table_name, deleted)
+        print(f"✅ Видалено {deleted} рядків з таблиці '{table_name}'")
+        return deleted
+
+    def _execute_for_rows(self, table_info: Dict[str, Any], statement: str, values: List[Any],
+                          where: Optional[Dict[str, Any]], ids: Optional[Iterable[int]]) -> int:
+        """Виконання UPDATE/DELETE над рядками, вибраними умовою або id, однією транзакцією; повертає кількість рядків"""
+        if (where is None) == (ids is None):
+            raise ValueError("Exactly one of 'where' or 'ids' must be given")
+
+        table_name = table_info['name']
+        statements = []
+        if where is not None:
+            condition, condition_values = self._where_clause(table_info, where)
+            for physical_table in self._physical_tables(table_info):
+                statements.append((f"{statement.format(table=physical_table)} WHERE {condition}",
+                                   values + condition_values))
+        else:
+            for physical_table, chunk in self._id_chunks(table_name, ids):
+                statements.append((f"{statement.format(table=physical_table)} "
+                                   f"WHERE id IN ({', '.join('?' for _ in chunk)})", values + chunk))
+
+        track_ids = self._tracks_dirty_rows(table_name)
+        cursor = self.connection.cursor()
+        try:
+            affected_ids = []
+            affected = 0
+            for query, params in statements:
+                print(f"📝 Виконуємо запит: {query}")
+                if track_ids:
+                    # RETURNING повертає змінені id без окремого запиту
+                    cursor.execute(f"{query} RETURNING id", params)
+                    affected_ids.extend(row[0] for row in cursor.fetchall())
+                else:
+                    cursor.execute(query, params)
+                    affected += cursor.rowcount
+            self._commit()
+
+            if track_ids:
+                self._mark_dirty(table_name, affected_ids)
+                return len(affected_ids)
+            self._mark_dirty(table_name)
+            return affected
+
+        except sqlite3.Error as e:
+            print(f"❌ SQLite помилка: {e}")
+            self._rollback()
+            raise
+
+    @staticmethod
+    def _physical_tables(table_info: Dict[str, Any]) -> List[str]:
+        """Фізичні таблиці, що зберігають рядки (для шардованих - по одній у кожному шарді)"""
+        if table_info.get('sharded'):
+            return [f"shard{shard}.{table_info['name']}" for shard in range(table_info['sharded']['shards'])]
+        return [table_info['name']]
+
+    def _id_chunks(self, table_name: str, ids: Iterable[int]):
+        """Розбиття унікальних id на порції для IN (...) у межах кожної фізичної таблиці"""
+        ids_by_table = {}
+        for row_id in dict.fromkeys(int(row_id) for row_id in ids):
+            ids_by_table.setdefault(self._table_for_row(table_name, row_id), []).append(row_id)
+        for physical_table, table_ids in ids_by_table.items():
+            for start in range(0, len(table_ids), SQL_VARIABLE_CHUNK):
+                yield physical_table, table_ids[start:start + SQL_VARIABLE_CHUNK]
+
+    def _where_clause(self, table_info: Dict[str, Any], where: Dict[str, Any]):
+        """Умова рівності за полями (список значень - належність до множини), значення кодуються як у рядках"""
+        if not where:
+            raise ValueError("Condition cannot be empty")
+
+        conditions = []
+        params = []
+        for field, expected in where.items():
+            if field != 'id' and field not in table_info['fields']:
+                raise ValueError(f"Field '{field}' not found in table '{table_info['name']}'")
+            options = list(expected) if isinstance(expected, (list, tuple, set, frozenset)) else [expected]
+            for option in options:
+                if field != 'id' and option is not None and not self._validate_row_data(table_info['name'],
+                                                                                        {field: option}):
+                    raise ValueError(f"Invalid condition value for field '{field}'")
+
+            encoded = [None if option is None else
+                       (int(option) if field == 'id' else self._encode_values(table_info, [field], [option])[0])
+                       for option in options]
+            if len(encoded) == 1:
+                conditions.append(f"{field} IS ?")
+            elif not encoded:
+                conditions.append("0")
+            else:
+                conditions.append(f"{field} IN ({', '.join('?' for _ in encoded)})")
+            params.extend(encoded)
+        return ' AND '.join(conditions), params
+
+    @_serialized_write
+    def delete_table(self, table_name: str):
+        """Видалення таблиці (або представлення) разом з індексами та тригерами підтримки"""
+        table_info = self._get_table_info(table_name)
+        if not table_info:
+            raise ValueError(f"Table '{table_name}' not found")
+
+        dependents = [table['name'] for table in self.tables if table['name'] != table_name and (
+            table_name in (table.get('maintained') or {}).values()
+            or (table.get('virtual') and re.search(rf"\b{re.escape(table_name)}\b", table['query'])))]
+        if dependents:
+            raise ValueError(f"Table '{table_name}' is used by {dependents}")
+
+        cursor = self.connection.cursor()
+        try:
+            if table_info.get('maintained'):
+                for side in ('left', 'right'):
+                    for event in ('insert', 'delete', 'update'):
+                        cursor.execute(f"DROP TRIGGER IF EXISTS {table_name}__{side}_{event}")
+                cursor.execute(f"DROP TABLE IF EXISTS {table_name}__counts")
+            self._drop_relation(table_name)
+            self._reset_id_sequence(cursor, table_name)
+            if self._change_log and not table_info.get('virtual'):
+                self._log_change(table_name, 'drop_table', None)
+            self._commit()
+
+            self.tables = [table for table in self.tables if table['name'] != table_name]
+            self._dirty_tables.discard(table_name)
+            self._dirty_rows.pop(table_name, None)
+            self._dropped_tables.add(table_name)
+            print(f"🗑️ Таблицю '{table_name}' видалено")
+            return True
+
+        except sqlite3.Error as e:
+            print(f"❌ SQLite помилка: {e}")
+            self._rollback()
+            raise
+
+    @_serialized_write
+    def truncate_table(self, table_name: str) -> int:
+        """Видалення всіх рядків таблиці зі скиданням лічильника id; повертає кількість видалених рядків"""
+        self._ensure_writable(table_name)
+        table_info = self._get_table_info(table_name)
+        if not table_info:
+            raise ValueError(f"Table '{table_name}' not found")
+
+        cursor = self.connection.cursor()
+        try:
+            deleted = 0
+            for physical_table in self._physical_tables(table_info):
+                cursor.execute(f"DELETE FROM {physical_table}")
+                deleted += cursor.rowcount
+            self._reset_id_sequence(cursor, table_name)
+            self._commit()
+
+            self._shard_next_ids.pop(table_name, None)
+            self._stats.pop(table_name, None)
+            self._mark_dirty(table_name)
+            print(f"🧹 Таблицю '{table_name}' очищено, видалено {deleted} рядків")
+            return deleted
+
+        except sqlite3.Error as e:
+            print(f"❌ SQLite помилка: {e}")
+            self._rollback()
+            raise
+
+    @staticmethod
+    def _reset_id_sequence(cursor: sqlite3.Cursor, table_name: str):
+        """Скидання лічильника AUTOINCREMENT (sqlite_sequence існує лише після першої такої таблиці)"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_sequence'")
+        if cursor.fetchone():
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table_name,))
+
+    @_serialized_write
+    def enable_change_log(self):
+        """Увімкнення журналу змін: кожна зміна рядків записується з порядковим номером у тій самій транзакції"""
+        if not self.connection:
+            raise ValueError("Database not connected")
+
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {CHANGE_LOG_TABLE} (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                           f"table_name TEXT NOT NULL, operation TEXT NOT NULL, row_id INTEGER, data TEXT)")
+            self._change_log = True
+            for table_info in self.tables:
+                self._install_change_triggers(table_info)
+            self._commit()
+            print(f"📜 Журнал змін увімкнено для бази '{self.name}'")
+            return True
+
+        except sqlite3.Error as e:
+            print(f"❌ SQLite помилка: {e}")
+            self._rollback()
+            raise
+
+    def _install_change_triggers(self, table_info: Dict[str, Any]):
+        """Тригери, що записують вставки, оновлення та видалення рядків таблиці до журналу змін"""
+        if table_info.get('virtual'):
+            return
+
+        table_name = table_info['name']
+        columns = {'id': 'NEW.id'}
+        for field, field_info in table_info['fields'].items():
+            if field_info.get('encoded'):
+                # Коди переліків декодуються під час запису, бо таблицю згодом можуть видалити чи перевизначити
+                columns[field] = (f"CASE NEW.{field} WHEN {EMPTY_ENUM_CODE} THEN '' ELSE "
+                                  f"(SELECT value FROM enum_{field_info['enum_name']}__codes "
+                                  f"WHERE code = NEW.{field}) END")
+            else:
+                columns[field] = f"NEW.{field}"
+        pairs = ', '.join(f"'{column}', {expression}" for column, expression in columns.items())
+        row_json = f"json_object({pairs})"
+        log_insert = f"INSERT INTO {CHANGE_LOG_TABLE} (table_name, operation, row_id, data) VALUES ('{table_name}', "
+
+        if table_info.get('sharded'):
+            # Тригери на таблицях приєднаних шардів можуть писати в основну базу лише як тимчасові
+            targets = [(f"TEMP TRIGGER IF NOT EXISTS {table_name}__cdc{shard}", f"shard{shard}.{table_name}")
+                       for shard in range(table_info['sharded']['shards'])]
+        else:
+            targets = [(f"TRIGGER IF NOT EXISTS {table_name}__cdc", table_name)]
+
+        cursor = self.connection.cursor()
+        for trigger, target in targets:
+            cursor.execute(f"CREATE {trigger}_insert AFTER INSERT ON {target} "
+                           f"BEGIN {log_insert}'insert', NEW.id, {row_json}); END")
+            cursor.execute(f"CREATE {trigger}_update AFTER UPDATE ON {target} "
+                           f"BEGIN {log_insert}'update', NEW.id, {row_json}); END")
+            cursor.execute(f"CREATE {trigger}_delete AFTER DELETE ON {target} "
+                           f"BEGIN {log_insert}'delete', OLD.id, NULL); END")
+
+    def _log_change(self, table_name: str, operation: str, data: Any):
+        """Запис зміни схеми (таблиці чи переліку) до журналу змін"""
+        self.connection.execute(
+            f"INSERT INTO {CHANGE_LOG_TABLE} (table_name, operation, row_id, data) VALUES (?, ?, NULL, ?)",
+            (table_name, operation, json.dumps(data, ensure_ascii=False,
+                                               default=lambda x: x.value if isinstance(x, Enum) else str(x))))
+
+    def changes_since(self, seq: int = 0, batch_size: int = 1000):
+        """Лінивий потік змін з номером, більшим за seq, у порядку їх фіксації"""
+        if not self._change_log:
+            raise ValueError("Change log is not enabled")
+
+        for change in self._iter_query(f"SELECT seq, table_name, operation, row_id, data FROM {CHANGE_LOG_TABLE} "
+                                       f"WHERE seq > ? ORDER BY seq", (seq,), batch_size=batch_size):
+            data = json.loads(change['data']) if change['data'] is not None else None
+            yield {'seq': change['seq'], 'table': change['table_name'], 'operation': change['operation'],
+                   'row_id': change['row_id'], 'data': data}
+
+    def last_change_seq(self) -> int:
+        """Номер останньої записаної зміни (0, якщо журнал порожній)"""
+        if not self._change_log:
+            raise ValueError("Change log is not enabled")
+        # Лічильник AUTOINCREMENT не зменшується після очищення журналу
+        row = self.connection.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (CHANGE_LOG_TABLE,)).fetchone()
+        return row[0] if row else 0
+
+    @_serialized_write
+    def prune_changes(self, upto_seq: int) -> int:
+        """Видалення змін, які вже застосували всі репліки"""
+        if not self._change_log:
+            raise ValueError("Change log is not enabled")
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"DELETE FROM {CHANGE_LOG_TABLE} WHERE seq <= ?", (upto_seq,))
+            self._commit()
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"❌ SQLite помилка: {e}")
+            self._rollback()
+            raise
+
+    @_serialized_write
+    def apply_changes(self, changes: Iterable[Dict[str, Any]]) -> int:
+        """Застосування потоку змін іншої бази однією транзакцією; повертає номер останньої застосованої зміни"""
+        last_seq = 0
+        applied = 0
+        try:
+            with self._single_transaction():
+                cursor = self.connection.cursor()
+                for change in changes:
+                    table_name, operation, data = change['table'], change['operation'], change['data']
+                    table_info = self._get_table_info(table_name)
+
+                    if operation == 'define_enum':
+                        self.define_enum(table_name, data)
+                    elif operation == 'create_table':
+                        if not table_info:
+                            restored = self._restore_table_info(data)
+                            sharding = restored.get('sharded') or {}
+                            self.create_table(table_name, restored['fields'], shards=sharding.get('shards'),
+                                              shard_key=sharding.get('key'))
+                    elif operation == 'drop_table':
+                        if table_info:
+                            self.delete_table(table_name)
+                    elif not table_info:
+                        raise ValueError(f"Table '{table_name}' not found for change {change['seq']}")
+                    elif operation == 'delete':
+                        physical_table = self._table_for_row(table_name, change['row_id'])
+                        cursor.execute(f"DELETE FROM {physical_table} WHERE id = ?", (change['row_id'],))
+                        self._mark_dirty(table_name, [change['row_id']])
+                    elif operation in ('insert', 'update'):
+                        columns = [column for column in data if column == 'id' or column in table_info['fields']]
+                        values = self._encode_values(table_info, columns, [data[column] for column in columns])
+                        if table_info.get('sharded'):
+                            self._insert_sharded(table_info, columns, [values], replace=True)
+                        else:
+                            cursor.execute(self._insert_query(table_name, columns, replace=True), values)
+                        self._mark_dirty(table_name, [change['row_id']])
+                    else:
+                        raise ValueError(f"Unsupported change operation: {operation}")
+
+                    self._stats.pop(table_name, None)
+                    last_seq = change['seq']
+                    applied += 1
+
+            print(f"📥 Застосовано {applied} змін (до номера {last_seq})")
+            return last_seq
+
+        except Exception as e:
+            print(f"❌ Помилка застосування змін: {e}")
+            raise
+
+    @_serialized_write
+    def execute_batch(self, operations: Iterable[Dict[str, Any]]) -> List[Any]:
+        """Виконання списку операцій ({'op', 'args', 'kwargs'}) однією транзакцією; повертає їх результати"""
+        results = []
+        with self._single_transaction():
+            for index, operation in enumerate(operations):
+                method = operation.get('op')
+                if method not in BATCH_OPERATIONS:
+                    raise ValueError(f"Unsupported batch operation #{index}: {method}")
+                try:
+                    results.append(getattr(self, method)(*operation.get('args', []), **operation.get('kwargs', {})))
+                except Exception as e:
+                    print(f"❌ Операція #{index} ({method}) пакета не виконана: {e}")
+                    raise
+        print(f"📦 Пакет з {len(results)} операцій виконано однією транзакцією")
+        return results
+
+    @contextmanager
+    def _single_transaction(self):
+        """Одна транзакція для кількох викликів: проміжні фіксації відкладаються, як у потоці-записувачі.
+
+        Після відкату відновлюється і опис схеми в пам'яті, щоб він відповідав файлу бази.
+        """
+        if not self.connection:
+            raise ValueError("Database not connected")
+        if self._writer_thread:
+            raise ValueError("A batch cannot run while the writer thread is running")
+
+        saved_tables = list(self.tables)
+        saved_enums = dict(self.enum_definitions)
+        self._group_commit_thread_id = threading.get_ident()
+        try:
+            # Явний BEGIN, інакше DDL на початку пакета виконується поза транзакцією і не відкочується
+            if not self.connection.in_transaction:
+                self.connection.execute("BEGIN")
+            yield
+            self._group_commit_thread_id = None
+            self.connection.commit()
+        except BaseException:
+            self._group_commit_thread_id = None
             self.connection.rollback()
+            self.tables = saved_tables
+            self.enum_definitions = saved_enums
+            self._stats = {}
+            self._shard_next_ids = {}
+            self._enum_codes = {}
+            self._enum_values = {}
+            for enum_name in self.enum_definitions:
+                self._sync_enum_codes(enum_name)
+            raise
+        finally:
+            self._group_commit_thread_id = None
+
+    @_serialized_write
+    def import_file(self, table_name: str, path: str, format: str = 'csv', batch_size: int = 5000,
+                    column_map: Optional[Dict[str, str]] = None, rejects_path: Optional[str] = None,
+                    workers: Optional[int] = None, queue_size: int = 4):
+        """Потокове імпортування рядків з CSV/JSONL файлу (з workers - конвеєр з паралельною валідацією)"""
+        if format not in ('csv', 'jsonl'):
+            raise ValueError(f"Unsupported import format: {format}")
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive")
+        if workers is not None and workers <= 0:
+            raise ValueError("Worker count must be positive")
+        if queue_size <= 0:
+            raise ValueError("Queue size must be positive")
+
+        table_info = self._get_table_info(table_name)
+        if not table_info:
+            raise ValueError(f"Table '{table_name}' not found")
+        self._ensure_writable(table_name)
+
+        column_map = column_map or {}
+        field_names = list(table_info['fields'].keys())
+        if rejects_path is None:
+            rejects_path = f"{path}.rejects.jsonl"
+
+        # Опис полів без посилань на базу, придатний для передачі в інші процеси
+        fields = {}
+        for field_name, field_info in table_info['fields'].items():
+            enum_values = None
+            if field_info['type'] == DataType.ENUM and field_info.get('enum_name') in self.enum_definitions:
+                enum_values = frozenset(self.enum_definitions[field_info['enum_name']])
+            fields[field_name] = (field_info['type'], enum_values)
+
+        inserted = 0
+        rejected = 0
+        rejects_file = None
+
+        def write(valid_values, rejects):
+            nonlocal inserted, rejected, rejects_file
+            for line_no, record in rejects:
+                if rejects_file is None:
+                    rejects_file = open(rejects_path, 'w', encoding='utf-8')
+                rejects_file.write(json.dumps({'line': line_no, 'data': record}, ensure_ascii=False) + '\n')
+            rejected += len(rejects)
+
+            if valid_values:
+                self._bulk_insert(table_name, field_names, valid_values)
+                inserted += len(valid_values)
+
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                if format == 'csv':
+                    records = ((line_no, record) for line_no, record in enumerate(csv.DictReader(f), 2))
+                else:
+                    records = ((line_no, self._parse_json_line(line))
+                               for line_no, line in enumerate(f, 1) if line.strip())
+                batches = iter(lambda: list(islice(records, batch_size)), [])
+
+                if workers:
+                    for valid_values, rejects in self._validation_pipeline(batches, fields, column_map,
+                                                                           workers, queue_size):
+                        write(valid_values, rejects)
+                else:
+                    for batch in batches:
+                        write(*_validate_import_batch(fields, column_map, batch))
+
+            print(f"📥 Імпортовано {inserted} рядків у таблицю '{table_name}', відхилено {rejected}")
+            return {'inserted': inserted, 'rejected': rejected,
+                    'rejects_path': rejects_path if rejected else None}
+
+        except sqlite3.Error as e:
+            print(f"❌ Помилка імпорту: {e}")
+            self._rollback()
+            raise
+        finally:
+            if rejects_file:
+                rejects_file.close()
+
+    @staticmethod
+    def _validation_pipeline(batches: Iterable[List[tuple]], fields: Dict[str, tuple], column_map: Dict[str, str],
+                             workers: int, queue_size: int):
+        """Конвеєр читач -> пул процесів валідації -> записувач, з'єднаний обмеженими чергами.
+
+        Потік-читач надсилає порції до пулу й кладе їхні результати у чергу в порядку файлу;
+        заповнена черга зупиняє читання, доки записувач не встигне вставити попередні порції.
+        """
+        pending = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        finished = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pending.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read(executor):
+            try:
+                for batch in batches:
+                    if not put(executor.submit(_validate_import_batch, fields, column_map, batch)):
+                        return
+                put(finished)
+            except Exception as e:
+                put(e)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            reader = threading.Thread(target=read, args=(executor,), name="import-reader", daemon=True)
+            reader.start()
+            try:
+                while True:
+                    item = pending.get()
+                    if item is finished:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item.result()
+            finally:
+                stop.set()
+                reader.join()
+                while not pending.empty():
+                    item = pending.get_nowait()
+                    if isinstance(item, Future):
+                        item.cancel()
+
+    def export_table(self, source: Union[str, Iterable[Dict[str, Any]]], path: str, format: str = 'csv',
+                     batch_size: int = 5000, compress: bool = False):
+        """Потоковий експорт таблиці або результату вибірки у файл"""
+        if format not in ('csv', 'jsonl', 'columnar'):
+            raise ValueError(f"Unsupported export format: {format}")
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive")
+
+        try:
+            if isinstance(source, str):
+                cursor = self.connection.cursor()
+                cursor.execute(f"SELECT * FROM {source}")
+                columns = [description[0] for description in cursor.description]
+                batches = iter(lambda: cursor.fetchmany(batch_size), [])
+                decode = self._row_decoder(self._get_table_info(source))
+                if decode:
+                    batches = ([tuple(decode(dict(zip(columns, row))).values()) for row in batch]
+                               for batch in batches)
+            else:
+                rows = iter(source)
+                first_batch = list(islice(rows, batch_size))
+                columns = list(first_batch[0].keys()) if first_batch else []
+                batches = (
+                    [tuple(row.get(column) for column in columns) for row in batch]
+                    for batch in self._chain_batches(first_batch, rows, batch_size)
+                )
+
+            exported = 0
+            if compress:
+                f = gzip.open(path, 'wt', encoding='utf-8', newline='')
+            else:
+                f = open(path, 'w', encoding='utf-8', newline='', buffering=1024 * 1024)
+
+            with f:
+                if format == 'csv':
+                    writer = csv.writer(f)
+                    writer.writerow(columns)
+                    for batch in batches:
+                        writer.writerows(batch)
+                        exported += len(batch)
+                elif format == 'jsonl':
+                    for batch in batches:
+                        f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+                                     for row in batch)
+                        exported += len(batch)
+                else:
+                    # Кожен рядок файлу - блок колонок: {"rows": n, "columns": {поле: [значення...]}}
+                    for batch in batches:
+                        block = {'rows': len(batch),
+                                 'columns': {column: [row[i] for row in batch] for i, column in enumerate(columns)}}
+                        f.write(json.dumps(block, ensure_ascii=False) + '\n')
+                        exported += len(batch)
+
+            print(f"📤 Експортовано {exported} рядків у файл: {path}")
+            return exported
+
+        except sqlite3.Error as e:
+            print(f"❌ Помилка експорту: {e}")
             raise
 
+    @staticmethod
+    def _chain_batches(first_batch: List[Any], rows, batch_size: int):
+        """Розбиття потоку рядків на пакети"""
+        batch = first_batch
+        while batch:
+            yield batch
+            batch = list(islice(rows, batch_size))
+
+    @staticmethod
+    def _parse_json_line(line: str):
+        """Розбір рядка JSONL (некоректний рядок повертається як є)"""
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            return line.rstrip('\n')
+
+    def _mark_dirty(self, table_name: str, row_ids: Optional[Iterable[int]] = None):
+        """Позначення таблиці або окремих рядків як змінених з моменту останнього збереження"""
+        if row_ids is None:
+            self._dirty_tables.add(table_name)
+            self._dirty_rows.pop(table_name, None)
+        elif self._tracks_dirty_rows(table_name):
+            self._dirty_rows.setdefault(table_name, set()).update(row_ids)
+
+        # Підтримувані перетини змінюються тригерами разом з вихідними таблицями
+        for table_info in self.tables:
+            maintained = table_info.get('maintained')
+            if (maintained and table_info['name'] != table_name
+                    and table_name in (maintained['left'], maintained['right'])):
+                self._dirty_tables.add(table_info['name'])
+                self._dirty_rows.pop(table_info['name'], None)
+                self._stats.pop(table_info['name'], None)
+
+    def _tracks_dirty_rows(self, table_name: str) -> bool:
+        """Чи потрібні id змінених рядків: лише для сегментів інкрементального збереження, поки таблиця не змінена цілком"""
+        return self._snapshot_path is not None and table_name not in self._dirty_tables
+
+    def _clear_dirty(self, snapshot_path: Optional[str] = None):
+        """Скидання відстежених змін після збереження"""
+        self._snapshot_path = snapshot_path
+        self._dirty_enums = set()
+        self._dirty_tables = set()
+        self._dirty_rows = {}
+        self._dropped_tables = set()
+
+    def _ensure_writable(self, table_name: str):
+        """Заборона прямих змін у представленнях та підтримуваних перетинах"""
+        table_info = self._get_table_info(table_name)
+        if table_info and (table_info.get('virtual') or table_info.get('maintained')):
+            raise ValueError(f"Table '{table_name}' is read-only")
+
+    def _get_table_info(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """Пошук опису таблиці за назвою"""
+        return next((table for table in self.tables if table['name'] == table_name), None)
+
+    def aggregate(self, table_name: str, function: str, field: Optional[str] = None):
+        """Агрегатна функція над полем таблиці (для шардованих - паралельно по шардах)"""
+        function = function.upper()
+        if function not in AGGREGATE_FUNCTIONS:
+            raise ValueError(f"Unsupported aggregate function: {function}")
+        if field is None and function != 'COUNT':
+            raise ValueError(f"Aggregate function {function} requires a field")
+
+        table_info = self._get_table_info(table_name)
+        if not table_info:
+            raise ValueError(f"Table '{table_name}' not found")
+
+        target = field or '*'
+        if not table_info.get('sharded'):
+            cursor = self.connection.cursor()
+            cursor.execute(f"SELECT {function}({target}) FROM {table_name}")
+            return cursor.fetchone()[0]
+
+        if function == 'AVG':
+            parts = [rows[0] for _, rows in self._fan_out(
+                table_info, f"SELECT SUM({target}), COUNT({target}) FROM {table_name}")]
+            total_count = sum(count for _, count in parts)
+            return sum(total for total, _ in parts if total is not None) / total_count if total_count else None
+
+        values = [rows[0][0] for _, rows in self._fan_out(table_info, f"SELECT {function}({target}) FROM {table_name}")]
+        values = [value for value in values if value is not None]
+        if not values:
+            return 0 if function == 'COUNT' else None
+        if function in ('COUNT', 'SUM'):
+            return sum(values)
+        return min(values) if function == 'MIN' else max(values)
+
+    def _shard_path(self, shard: int) -> str:
+        """Шлях до файлу шарда"""
+        return f"databases/{self.name}_shard{shard}.db"
+
+    def _attach_shards(self, shard_count: int):
+        """Приєднання файлів шардів до основного з'єднання"""
+        cursor = self.connection.cursor()
+        cursor.execute("PRAGMA database_list")
+        attached = {row[1] for row in cursor.fetchall()}
+        for shard in range(shard_count):
+            if f"shard{shard}" not in attached:
+                cursor.execute(f"ATTACH DATABASE ? AS shard{shard}", (self._shard_path(shard),))
+                self._apply_profile(self.profile, [f"shard{shard}"])
+
+    def _create_shard_view(self, table_info: Dict[str, Any]):
+        """Тимчасове представлення, що об'єднує шарди для операцій читання"""
+        table_name = table_info['name']
+        shard_selects = ' UNION ALL '.join(f"SELECT * FROM shard{shard}.{table_name}"
+                                           for shard in range(table_info['sharded']['shards']))
+        self.connection.execute(f"DROP VIEW IF EXISTS temp.{table_name}")
+        self.connection.execute(f"CREATE TEMP VIEW {table_name} AS {shard_selects}")
+
+    def _restore_shards(self):
+        """Повторне приєднання шардів і представлень після підключення або завантаження схеми"""
+        for table_info in self.tables:
+            if table_info.get('sharded'):
+                self._attach_shards(table_info['sharded']['shards'])
+                self._create_shard_view(table_info)
+                # Тимчасові тригери журналу змін живуть лише в межах з'єднання
+                if self._change_log:
+                    self._install_change_triggers(table_info)
+
+    def _table_for_row(self, table_name: str, row_id: int) -> str:
+        """Фізична таблиця, що зберігає рядок (для шардованих - таблиця шарда-власника)"""
+        table_info = self._get_table_info(table_name)
+        if table_info and table_info.get('sharded'):
+            return f"shard{(int(row_id) - 1) % table_info['sharded']['shards']}.{table_name}"
+        return table_name
+
+    def _peek_shard_id(self, table_info: Dict[str, Any], shard: int) -> int:
+        """Наступний вільний id шарда (id шарда k мають остачу k від ділення id - 1 на кількість шардів)"""
+        next_ids = self._shard_next_ids.setdefault(table_info['name'], {})
+        if shard not in next_ids:
+            cursor = self.connection.cursor()
+            cursor.execute(f"SELECT MAX(id) FROM shard{shard}.{table_info['name']}")
+            max_id = cursor.fetchone()[0]
+            next_ids[shard] = max_id + table_info['sharded']['shards'] if max_id else shard + 1
+        return next_ids[shard]
+
+    def _next_shard_id(self, table_info: Dict[str, Any], shard: int) -> int:
+        """Виділення нового id у шарді"""
+        row_id = self._peek_shard_id(table_info, shard)
+        self._shard_next_ids[table_info['name']][shard] += table_info['sharded']['shards']
+        return row_id
+
+    def _insert_sharded(self, table_info: Dict[str, Any], columns: List[str], rows: Iterable[Iterable[Any]],
+                        replace: bool = False) -> List[int]:
+        """Маршрутизація вставки рядків до шардів за id або ключовим полем"""
+        sharding = table_info['sharded']
+        shard_count = sharding['shards']
+        table_name = table_info['name']
+        has_ids = 'id' in columns
+        insert_columns = columns if has_ids else ['id'] + list(columns)
+        key_index = columns.index(sharding['key']) if sharding['key'] in columns else None
+
+        grouped = {}
+        row_ids = []
+        for row in rows:
+            row = list(row)
+            if has_ids:
+                row_id = int(row[columns.index('id')])
+                shard = (row_id - 1) % shard_count
+            else:
+                if key_index is not None:
+                    shard = _key_partition((row[key_index],), shard_count)
+                else:
+                    # Маршрутизація за id: наступний глобальний id визначає шард
+                    shard = min(range(shard_count), key=lambda candidate: self._peek_shard_id(table_info, candidate))
+                row_id = self._next_shard_id(table_info, shard)
+                row = [row_id] + row
+            grouped.setdefault(shard, []).append(row)
+            row_ids.append(row_id)
+
+        if has_ids:
+            self._shard_next_ids.pop(table_name, None)
+
+        cursor = self.connection.cursor()
+        for shard, shard_rows in grouped.items():
+            cursor.executemany(self._insert_query(f"shard{shard}.{table_name}", insert_columns, replace), shard_rows)
+        return row_ids
+
+    @staticmethod
+    def _insert_query(target: str, columns: List[str], replace: bool = False) -> str:
+        """Запит вставки; заміна існуючого id виконується як UPSERT, щоб спрацювали тригери оновлення (FTS, перетини)"""
+        query = f"INSERT INTO {target} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        if replace:
+            updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column != 'id')
+            query += f" ON CONFLICT(id) DO UPDATE SET {updates}" if updates else " ON CONFLICT(id) DO NOTHING"
+        return query
+
+    def _fan_out(self, table_info: Dict[str, Any], query: str, params: Iterable[Any] = ()):
+        """Паралельне виконання запиту на кожному шарді окремим з'єднанням"""
+        params = tuple(params)
+
+        def run(shard):
+            connection = sqlite3.connect(f"file:{os.path.abspath(self._shard_path(shard))}?mode=ro", uri=True)
+            try:
+                cursor = connection.execute(query, params)
+                return [description[0] for description in cursor.description], cursor.fetchall()
+            finally:
+                connection.close()
+
+        shard_count = table_info['sharded']['shards']
+        with ThreadPoolExecutor(max_workers=shard_count) as executor:
+            return list(executor.map(run, range(shard_count)))
+
     def _validate_email(self, email: str) -> bool:
         """Валідація email адреси"""
         if not isinstance(email, str) or not email:
             return False
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+        return EMAIL_PATTERN.match(email) is not None
 
     def _validate_enum(self, value: str, enum_name: str) -> bool:
         """Валідація перелічуваного типу"""
         if enum_name not in self.enum_definitions:
             return False
-        return value in self.enum_definitions[enum_name]
+        if enum_name not in self._enum_codes:
+            self._sync_enum_codes(enum_name)
+        return value in self._enum_codes[enum_name]
 
     def _validate_row_data(self, table_name: str, data: Dict[str, Any]) -> bool:
         """Валідація даних рядка"""
@@ -232,89 +1903,716 @@ class Database:
             field_info = table_info['fields'][field_name]
             field_type = field_info['type']
 
-            if not value and field_type != DataType.INTEGER and field_type != DataType.REAL:
-                continue
-
-            try:
-                if field_type == DataType.INTEGER:
-                    if value:
-                        int(value)
-                elif field_type == DataType.REAL:
-                    if value:
-                        float(value)
-                elif field_type == DataType.CHAR:
-                    if value and (not isinstance(value, str) or len(value) != 1):
+            if field_type == DataType.ENUM:
+                if value:
+                    enum_name = field_info.get('enum_name')
+                    if not enum_name or not self._validate_enum(value, enum_name):
                         return False
-                elif field_type == DataType.EMAIL:
-                    if value and not self._validate_email(value):
-                        return False
-                elif field_type == DataType.ENUM:
-                    if value:
-                        enum_name = field_info.get('enum_name')
-                        if not enum_name or not self._validate_enum(value, enum_name):
-                            return False
-            except (ValueError, TypeError):
+            elif not _valid_field_value(field_type, value):
                 return False
 
         return True
 
-    def intersect_tables(self, table1_name: str, table2_name: str, common_fields: List[str]) -> str:
+    @_serialized_write
+    def intersect_tables(self, table1_name: str, table2_name: str, common_fields: List[str],
+                         as_view: bool = False, maintained: bool = False, workers: Optional[int] = None,
+                         memory_limit: Optional[int] = None) -> str:
         """Перетин двох таблиць по спільним полям"""
         print(f"🔍 Виконуємо перетин таблиць '{table1_name}' і '{table2_name}' по полях: {common_fields}")
 
+        if as_view and maintained:
+            raise ValueError("A view result cannot be incrementally maintained")
+        if maintained and any(self._enum_signature(self._get_table_info(table1_name), field) !=
+                              self._enum_signature(self._get_table_info(table2_name), field)
+                              for field in common_fields):
+            raise ValueError("Maintained intersections require comparable key fields")
+
         try:
-            table1_data = self.get_rows(table1_name)
-            table2_data = self.get_rows(table2_name)
+            strategy = 'auto'
+            if workers and workers > 1:
+                strategy = 'parallel'
+            elif memory_limit:
+                strategy = 'hash'
+            result_table_name = self.set_operation('intersect', table1_name, table2_name, common_fields,
+                                                   strategy=strategy, materialize=True, as_view=as_view,
+                                                   result_table_name=f"intersect_{table1_name}_{table2_name}",
+                                                   workers=workers, memory_limit=memory_limit)
+
+            if as_view:
+                print(f"✅ Перетин завершено. Створено представлення '{result_table_name}'")
+                return result_table_name
+
+            if maintained:
+                result_info = self._get_table_info(result_table_name)
+                result_info['maintained'] = {'left': table1_name, 'right': table2_name, 'fields': common_fields}
+                self._install_intersection_maintenance(result_info)
+
+            row_count = self._estimate_row_count(result_table_name)
+            print(f"✅ Перетин завершено. Створено таблицю '{result_table_name}' з {row_count} рядками")
+            return result_table_name
 
-            result_table_name = f"intersect_{table1_name}_{table2_name}"
+        except Exception as e:
+            print(f"❌ Помилка перетину таблиць: {e}")
+            raise
 
-            table1_info = next((table for table in self.tables if table['name'] == table1_name), None)
+    def union_tables(self, left: Union[str, Iterable[Dict[str, Any]]], right: Union[str, Iterable[Dict[str, Any]]],
+                     key_fields: List[str], **options):
+        """Об'єднання унікальних ключів двох джерел"""
+        return self.set_operation('union', left, right, key_fields, **options)
+
+    def difference_tables(self, left: Union[str, Iterable[Dict[str, Any]]],
+                          right: Union[str, Iterable[Dict[str, Any]]], key_fields: List[str], **options):
+        """Різниця: ключі першого джерела, яких немає в другому"""
+        return self.set_operation('difference', left, right, key_fields, **options)
+
+    def semi_join(self, left: Union[str, Iterable[Dict[str, Any]]], right: Union[str, Iterable[Dict[str, Any]]],
+                  key_fields: List[str], **options):
+        """Напівз'єднання: рядки першого джерела, що мають пару в другому"""
+        return self.set_operation('semi_join', left, right, key_fields, **options)
+
+    def anti_join(self, left: Union[str, Iterable[Dict[str, Any]]], right: Union[str, Iterable[Dict[str, Any]]],
+                  key_fields: List[str], **options):
+        """Антиз'єднання: рядки першого джерела без пари в другому"""
+        return self.set_operation('anti_join', left, right, key_fields, **options)
+
+    def set_operation(self, operation: str, left: Union[str, Iterable[Dict[str, Any]]],
+                      right: Union[str, Iterable[Dict[str, Any]]], key_fields: List[str], strategy: str = 'auto',
+                      materialize: bool = False, result_table_name: Optional[str] = None, batch_size: int = 5000,
+                      as_view: bool = False, workers: Optional[int] = None, memory_limit: Optional[int] = None):
+        """Виконання операції над множинами: SQL на боці SQLite, хешування в Python або паралельно"""
+        if operation not in SET_OPERATIONS:
+            raise ValueError(f"Unsupported set operation: {operation}")
+        if strategy not in ('auto', 'sql', 'hash', 'parallel'):
+            raise ValueError(f"Unsupported execution strategy: {strategy}")
+        if not key_fields:
+            raise ValueError("Key fields cannot be empty")
+
+        sources_info = []
+        for source in (left, right):
+            if isinstance(source, str):
+                table_info = self._get_table_info(source)
+                if not table_info:
+                    raise ValueError(f"Table '{source}' not found")
+                missing = [field for field in key_fields if field not in table_info['fields']]
+                if missing:
+                    raise ValueError(f"Fields {missing} not found in table '{source}'")
+                sources_info.append(table_info)
+            else:
+                sources_info.append(None)
+
+        both_tables = all(sources_info)
+        # Коди переліків порівнюються напряму лише тоді, коли обидва поля кодуються одним переліком
+        comparable = both_tables and all(self._enum_signature(sources_info[0], field) ==
+                                         self._enum_signature(sources_info[1], field) for field in key_fields)
+        if strategy == 'auto':
+            strategy = 'sql' if comparable else 'hash'
+        elif strategy == 'sql' and not comparable:
+            raise ValueError("SQL execution requires two tables with comparable key fields")
+        elif strategy == 'parallel' and (operation != 'intersect' or not comparable or self.in_memory):
+            raise ValueError("Parallel execution supports only intersections of on-disk tables")
+        if as_view and strategy != 'sql':
+            raise ValueError("View results require SQL execution over two tables")
+
+        if strategy == 'sql':
+            query = self._set_operation_query(operation, left, right, key_fields)
+
+        if not materialize:
+            if strategy == 'sql':
+                return self._iter_query(query, batch_size=batch_size, table_info=sources_info[0])
+            return self._set_operation_rows(operation, left, right, key_fields, strategy, batch_size, workers,
+                                            memory_limit)
+
+        if not result_table_name:
+            if not both_tables:
+                raise ValueError("Result table name is required for non-table sources")
+            result_table_name = f"{operation}_{left}_{right}"
+
+        left_info, right_info = sources_info
+        if operation in ('semi_join', 'anti_join'):
+            if not left_info:
+                raise ValueError("Materialized joins require the left source to be a table")
+            result_fields = {field: self._result_field_info(field_info)
+                             for field, field_info in left_info['fields'].items()}
+        else:
             result_fields = {}
+            for field in key_fields:
+                field_info = next((info['fields'][field] for info in sources_info if info), None)
+                result_fields[field] = self._result_field_info(field_info) if field_info else {'type': DataType.STRING}
+
+        if as_view:
+            self._create_view(result_table_name, query, result_fields)
+            return result_table_name
+
+        self.create_table(result_table_name, result_fields)
+        columns = list(result_fields.keys())
+
+        if strategy == 'sql':
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute(f"INSERT INTO {result_table_name} ({', '.join(columns)}) "
+                               f"SELECT {', '.join(columns)} FROM ({query})")
+                self._commit()
+                self._mark_dirty(result_table_name)
+            except sqlite3.Error as e:
+                print(f"❌ Помилка операції над множинами: {e}")
+                self._rollback()
+                raise
+        else:
+            rows = self._set_operation_rows(operation, left, right, key_fields, strategy, batch_size, workers,
+                                            memory_limit)
+            self._bulk_insert(result_table_name, columns, (tuple(row.get(column) for column in columns)
+                                                           for row in rows))
+
+        print(f"✅ Операцію '{operation}' виконано, результат у таблиці '{result_table_name}'")
+        return result_table_name
+
+    def _install_intersection_maintenance(self, result_info: Dict[str, Any]):
+        """Лічильники посилань на ключі та тригери для інкрементальної підтримки перетину"""
+        result_name = result_info['name']
+        maintained = result_info['maintained']
+        fields = maintained['fields']
+        counts_table = f"{result_name}__counts"
+        keys = ', '.join(fields)
+
+        def match(prefix):
+            return ' AND '.join(f"{field} IS {prefix}.{field}" for field in fields)
+
+        def new_values(prefix):
+            return ', '.join(f"{prefix}.{field}" for field in fields)
 
-            for field in common_fields:
-                if table1_info and field in table1_info['fields']:
-                    result_fields[field] = table1_info['fields'][field]
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {counts_table}")
+            cursor.execute(f"CREATE TABLE {counts_table} ({keys}, left_count INTEGER NOT NULL, "
+                           f"right_count INTEGER NOT NULL)")
+            cursor.execute(f"CREATE INDEX {counts_table}_keys ON {counts_table} ({keys})")
+            # Без індексу кожне видалення ключа тригером сканувало б увесь результат
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {result_name}__keys ON {result_name} ({keys})")
+            cursor.execute(f"INSERT INTO {counts_table} ({keys}, left_count, right_count) "
+                           f"SELECT {keys}, SUM(l), SUM(r) FROM ("
+                           f"SELECT {keys}, 1 AS l, 0 AS r FROM {maintained['left']} UNION ALL "
+                           f"SELECT {keys}, 0 AS l, 1 AS r FROM {maintained['right']}) GROUP BY {keys}")
+
+            for side, source in (('left', maintained['left']), ('right', maintained['right'])):
+                other = 'right' if side == 'left' else 'left'
+                add_key = (
+                    f"INSERT INTO {counts_table} ({keys}, left_count, right_count) "
+                    f"SELECT {new_values('NEW')}, 0, 0 WHERE NOT EXISTS "
+                    f"(SELECT 1 FROM {counts_table} WHERE {match('NEW')}); "
+                    f"UPDATE {counts_table} SET {side}_count = {side}_count + 1 WHERE {match('NEW')}; "
+                    f"INSERT INTO {result_name} ({keys}) SELECT {new_values('NEW')} WHERE EXISTS "
+                    f"(SELECT 1 FROM {counts_table} WHERE {match('NEW')} "
+                    f"AND {side}_count = 1 AND {other}_count > 0); "
+                )
+                remove_key = (
+                    f"UPDATE {counts_table} SET {side}_count = {side}_count - 1 WHERE {match('OLD')}; "
+                    f"DELETE FROM {result_name} WHERE {match('OLD')} AND EXISTS "
+                    f"(SELECT 1 FROM {counts_table} WHERE {match('OLD')} "
+                    f"AND {side}_count = 0 AND {other}_count > 0); "
+                    f"DELETE FROM {counts_table} WHERE {match('OLD')} AND left_count = 0 AND right_count = 0; "
+                )
+                changed = ' OR '.join(f"OLD.{field} IS NOT NEW.{field}" for field in fields)
+
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {result_name}__{side}_insert "
+                               f"AFTER INSERT ON {source} BEGIN {add_key} END")
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {result_name}__{side}_delete "
+                               f"AFTER DELETE ON {source} BEGIN {remove_key} END")
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {result_name}__{side}_update "
+                               f"AFTER UPDATE OF {keys} ON {source} WHEN {changed} "
+                               f"BEGIN {remove_key}{add_key} END")
+
+            self._commit()
+            print(f"✅ Перетин '{result_name}' підтримується інкрементально")
+
+        except sqlite3.Error as e:
+            print(f"❌ SQLite помилка: {e}")
+            self._rollback()
+            raise Exception(f"Помилка бази даних: {e}")
+
+    @staticmethod
+    def _result_field_info(field_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Опис поля для таблиці-результату: тип і кодування переліку без повнотекстового індексу джерела"""
+        return {key: value for key, value in field_info.items() if key in ('type', 'enum_name', 'encoded')}
+
+    def _create_view(self, view_name: str, query: str, fields: Dict[str, Dict]):
+        """Реєстрація результату як VIEW - віртуальної таблиці лише для читання"""
+        if not self.connection:
+            raise ValueError("Database not connected")
+
+        try:
+            create_query = f"CREATE VIEW IF NOT EXISTS {view_name} AS {query}"
+            print(f"📝 Виконуємо запит: {create_query}")
+            self.connection.execute(create_query)
+            self._commit()
+
+            self.tables.append({
+                'name': view_name,
+                'fields': fields,
+                'virtual': True,
+                'query': query
+            })
+            self._mark_dirty(view_name)
+
+            print(f"✅ Представлення '{view_name}' створено успішно")
+            return True
 
-            self.create_table(result_table_name, result_fields)
+        except sqlite3.Error as e:
+            print(f"❌ SQLite помилка: {e}")
+            self._rollback()
+            raise Exception(f"Помилка бази даних: {e}")
 
-            common_rows = []
-            for row1 in table1_data:
-                for row2 in table2_data:
-                    match = True
-                    for field in common_fields:
-                        if row1.get(field) != row2.get(field):
-                            match = False
-                            break
+    @staticmethod
+    def _set_operation_query(operation: str, left: str, right: str, key_fields: List[str]) -> str:
+        """Побудова SQL запиту для операції над множинами"""
+        keys = ', '.join(key_fields)
+        if operation in SET_OPERATORS_SQL:
+            return f"SELECT {keys} FROM {left} {SET_OPERATORS_SQL[operation]} SELECT {keys} FROM {right}"
+
+        match = ' AND '.join(f"r.{field} IS l.{field}" for field in key_fields)
+        exists = 'EXISTS' if operation == 'semi_join' else 'NOT EXISTS'
+        return f"SELECT l.* FROM {left} AS l WHERE {exists} (SELECT 1 FROM {right} AS r WHERE {match}) ORDER BY l.id"
+
+    def _set_operation_rows(self, operation: str, left, right, key_fields: List[str], strategy: str,
+                            batch_size: int, workers: Optional[int], memory_limit: Optional[int]):
+        """Рядки результату для виконання поза SQLite"""
+        if strategy == 'parallel':
+            return self._parallel_intersect(left, right, key_fields, workers or os.cpu_count() or 1)
+        return self._hash_set_operation(operation, left, right, key_fields, batch_size, memory_limit)
+
+    def _parallel_intersect(self, left: str, right: str, key_fields: List[str], workers: int):
+        """Паралельний перетин: процеси читають неперетинні діапазони id, розкладають ключі за хеш-розділами
+        на диск, а потім перетинають розділи"""
+        # Робочі процеси читають файл напряму, тому всі зміни мають бути зафіксовані
+        if self._group_commit_thread_id == threading.get_ident():
+            raise ValueError("Parallel execution cannot run inside a grouped transaction")
+        self.connection.commit()
+        db_path = os.path.abspath(self.file_path)
+        partitions = workers
+
+        # Множина ключів будується для меншої таблиці, друга лише перевіряється
+        build_table, probe_table = left, right
+        if self._estimate_row_count(right) < self._estimate_row_count(left):
+            build_table, probe_table = right, left
+
+        with tempfile.TemporaryDirectory(prefix='parallel_') as spill_dir, \
+                concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            # Кожен рядок обох таблиць читається і хешується рівно один раз - у процесі свого діапазону
+            scans = {'build': [], 'probe': []}
+            for side, table_name in (('build', build_table), ('probe', probe_table)):
+                cursor = self.connection.cursor()
+                cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table_name}")
+                min_id, max_id = cursor.fetchone()
+                if min_id is None:
+                    return iter([])
+                step = (max_id - min_id) // workers + 1
+                for index, id_from in enumerate(range(min_id, max_id + 1, step)):
+                    tag = f"{side}{index}"
+                    scans[side].append((tag, executor.submit(_spill_key_range, db_path, table_name, key_fields,
+                                                             id_from, id_from + step - 1, partitions, spill_dir, tag)))
+            rows_read = sum(future.result() for tags in scans.values() for _, future in tags)
+
+            build_tags = [tag for tag, _ in scans['build']]
+            probe_tags = [tag for tag, _ in scans['probe']]
+            intersections = [executor.submit(_intersect_spilled_partition, spill_dir, build_tags, probe_tags, partition)
+                             for partition in range(partitions)]
+            partition_keys = [future.result() for future in intersections]
+
+        print(f"⚙️ Паралельний перетин: прочитано {rows_read} рядків у {len(build_tags) + len(probe_tags)} діапазонах")
+        decode = self._row_decoder(self._get_table_info(left)) or (lambda row: row)
+        return (decode(dict(zip(key_fields, key))) for keys in partition_keys for key in keys)
+
+    def _hash_set_operation(self, operation: str, left, right, key_fields: List[str], batch_size: int,
+                            memory_limit: Optional[int] = None):
+        """Операція над множинами через хеш-таблицю ключів (лінивий ітератор)"""
+        def key_of(row):
+            return tuple(row.get(field) for field in key_fields)
+
+        if operation == 'intersect' and isinstance(left, str) and isinstance(right, str):
+            # Перетин симетричний: хеш-таблиця будується на стороні з меншою кількістю різних ключів
+            if self._estimate_distinct(left, key_fields) < self._estimate_distinct(right, key_fields):
+                left, right = right, left
+
+        left_rows = self._iter_source(left, batch_size)
+        right_rows = self._iter_source(right, batch_size)
+        used_memory = 0
+
+        if operation == 'union':
+            seen = set()
+            all_keys = (key_of(row) for row in chain(left_rows, right_rows))
+            for key in all_keys:
+                if key not in seen:
+                    seen.add(key)
+                    yield dict(zip(key_fields, key))
+                    used_memory += self._estimate_key_size(key)
+                    if memory_limit and used_memory > memory_limit:
+                        partitions = self._grace_partition_count(used_memory, len(seen), memory_limit, left, right)
+                        yield from self._grace_hash_set_operation(operation, iter(()), all_keys, key_fields,
+                                                                  partitions, emitted_keys=seen)
+                        return
+            return
+
+        right_keys = set()
+        remaining_right = (key_of(row) for row in right_rows)
+        for key in remaining_right:
+            if key not in right_keys:
+                right_keys.add(key)
+                used_memory += self._estimate_key_size(key)
+                if memory_limit and used_memory > memory_limit:
+                    # Сторона побудови не вміщується у пам'ять - перехід до grace-hash з розділами на диску
+                    partitions = self._grace_partition_count(used_memory, len(right_keys), memory_limit, right)
+                    build_keys = chain(right_keys, remaining_right)
+                    # Кадр генератора лишається живим під час обробки розділів, тож посилання на множину знімається
+                    right_keys = None
+                    yield from self._grace_hash_set_operation(operation, left_rows, build_keys, key_fields, partitions)
+                    return
+
+        if operation in ('semi_join', 'anti_join'):
+            keep_matches = operation == 'semi_join'
+            for row in left_rows:
+                if (key_of(row) in right_keys) == keep_matches:
+                    yield row
+            return
+
+        if operation == 'intersect':
+            # Виданий ключ вилучається з хеш-таблиці, тож окрема множина виданих ключів не потрібна
+            for row in left_rows:
+                key = key_of(row)
+                if key in right_keys:
+                    right_keys.discard(key)
+                    yield dict(zip(key_fields, key))
+            return
+
+        seen = set()
+        for row in left_rows:
+            key = key_of(row)
+            if key not in seen and key not in right_keys:
+                seen.add(key)
+                yield dict(zip(key_fields, key))
+                # Видані ключі різниці рахуються в тому самому ліміті, що й сторона побудови
+                used_memory += self._estimate_key_size(key)
+                if memory_limit and used_memory > memory_limit:
+                    partitions = self._grace_partition_count(used_memory, len(right_keys) + len(seen),
+                                                             memory_limit, left, right)
+                    build_keys = iter(right_keys)
+                    right_keys = None
+                    yield from self._grace_hash_set_operation(operation, left_rows, build_keys, key_fields,
+                                                              partitions, emitted_keys=seen)
+                    return
+
+    def _grace_hash_set_operation(self, operation: str, left_rows, right_keys, key_fields: List[str],
+                                  partitions: int, emitted_keys: Optional[set] = None):
+        """Grace-hash виконання: розділи обох сторін скидаються у тимчасові файли й обробляються по одному"""
+        def key_of(row):
+            return tuple(row.get(field) for field in key_fields)
+
+        print(f"💽 Перевищено ліміт пам'яті, операцію '{operation}' виконуємо через {partitions} розділів на диску")
+
+        with tempfile.TemporaryDirectory(prefix='grace_') as spill_dir:
+            def spill(side, items, key_func):
+                files = [open(os.path.join(spill_dir, f"{side}_{partition}.bin"), 'wb')
+                         for partition in range(partitions)]
+                try:
+                    for item in items:
+                        pickle.dump(item, files[_key_partition(key_func(item), partitions)],
+                                    pickle.HIGHEST_PROTOCOL)
+                finally:
+                    for f in files:
+                        f.close()
+
+            def load(side, partition):
+                with open(os.path.join(spill_dir, f"{side}_{partition}.bin"), 'rb') as f:
+                    while True:
+                        try:
+                            yield pickle.load(f)
+                        except EOFError:
+                            return
+
+            def identity(key):
+                return key
+
+            if emitted_keys is not None:
+                spill('emitted', emitted_keys, identity)
+                emitted_keys.clear()
+            spill('right', right_keys, identity)
+            join_rows = operation in ('semi_join', 'anti_join')
+            if join_rows:
+                spill('left', left_rows, key_of)
+            else:
+                spill('left', (key_of(row) for row in left_rows), identity)
+
+            for partition in range(partitions):
+                if operation == 'union':
+                    seen = set(load('emitted', partition))
+                    for key in load('right', partition):
+                        if key not in seen:
+                            seen.add(key)
+                            yield dict(zip(key_fields, key))
+                    continue
+
+                partition_keys = set(load('right', partition))
+                if join_rows:
+                    keep_matches = operation == 'semi_join'
+                    for row in load('left', partition):
+                        if (key_of(row) in partition_keys) == keep_matches:
+                            yield row
+                    continue
+
+                if operation == 'intersect':
+                    for key in load('left', partition):
+                        if key in partition_keys:
+                            partition_keys.discard(key)
+                            yield dict(zip(key_fields, key))
+                    continue
+
+                # Ключі, видані до переходу на розділи, не повторюються
+                seen = set(load('emitted', partition)) if emitted_keys is not None else set()
+                for key in load('left', partition):
+                    if key not in seen and key not in partition_keys:
+                        seen.add(key)
+                        yield dict(zip(key_fields, key))
+
+    def _grace_partition_count(self, used_memory: int, key_count: int, memory_limit: int, *sources) -> int:
+        """Кількість розділів, щоб кожен розділ сторони побудови вміщувався у ліміт пам'яті"""
+        estimated_rows = sum(self._estimate_row_count(source) if isinstance(source, str) else key_count
+                             for source in sources)
+        estimated_memory = used_memory / max(key_count, 1) * max(estimated_rows, key_count)
+        return max(GRACE_MIN_PARTITIONS, math.ceil(2 * estimated_memory / memory_limit))
+
+    @staticmethod
+    def _estimate_key_size(key: tuple) -> int:
+        """Приблизний обсяг пам'яті ключа разом із місцем у хеш-таблиці"""
+        return sys.getsizeof(key) + sum(sys.getsizeof(value) for value in key) + 32
+
+    def _iter_source(self, source: Union[str, Iterable[Dict[str, Any]]], batch_size: int):
+        """Потік рядків з таблиці або довільного ітерованого джерела"""
+        if isinstance(source, str):
+            return self._iter_query(f"SELECT * FROM {source}", batch_size=batch_size,
+                                    table_info=self._get_table_info(source))
+        return iter(source)
+
+    def _iter_query(self, query: str, params: Iterable[Any] = (), batch_size: int = 5000,
+                    table_info: Optional[Dict[str, Any]] = None):
+        """Лінивий потік рядків результату запиту у вигляді словників (з декодуванням переліків таблиці)"""
+        cursor = self.connection.cursor()
+        cursor.execute(query, tuple(params))
+        columns = [description[0] for description in cursor.description]
+        decode = self._row_decoder(table_info)
+        for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+            for row in rows:
+                yield decode(dict(zip(columns, row))) if decode else dict(zip(columns, row))
 
-                    if match:
-                        common_data = {field: row1[field] for field in common_fields}
-                        if common_data not in common_rows:
-                            common_rows.append(common_data)
+    @_serialized_write
+    def intersect_many(self, table_names: List[str], common_fields: List[str], batch_size: int = 5000) -> str:
+        """Перетин кількох таблиць за один прохід, починаючи з найменшої"""
+        if len(table_names) < 2 or not common_fields:
+            raise ValueError("At least two tables and one common field are required")
 
-            for row_data in common_rows:
-                self.add_row(result_table_name, row_data)
+        print(f"🔍 Виконуємо перетин таблиць {table_names} по полях: {common_fields}")
 
-            print(f"✅ Перетин завершено. Створено таблицю '{result_table_name}' з {len(common_rows)} рядками")
+        try:
+            for table_name in table_names:
+                table_info = self._get_table_info(table_name)
+                if not table_info:
+                    raise ValueError(f"Table '{table_name}' not found")
+                missing = [field for field in common_fields if field not in table_info['fields']]
+                if missing:
+                    raise ValueError(f"Fields {missing} not found in table '{table_name}'")
+
+            first_table_info = self._get_table_info(table_names[0])
+            for table_name in table_names[1:]:
+                table_info = self._get_table_info(table_name)
+                if any(self._enum_signature(table_info, field) != self._enum_signature(first_table_info, field)
+                       for field in common_fields):
+                    raise ValueError(f"Fields of table '{table_name}' are not comparable with '{table_names[0]}'")
+
+            # Порядок перебору: від таблиці з найменшою кількістю різних ключів до найбільшої
+            ordered_tables = sorted(table_names, key=lambda table: self._estimate_distinct(table, common_fields))
+            select_fields = ', '.join(common_fields)
+            cursor = self.connection.cursor()
+
+            cursor.execute(f"SELECT {select_fields} FROM {ordered_tables[0]}")
+            common_keys = {}
+            for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+                for row in rows:
+                    common_keys[tuple(row)] = None
+
+            for table_name in ordered_tables[1:]:
+                if not common_keys:
+                    break
+                cursor.execute(f"SELECT {select_fields} FROM {table_name}")
+                matched_keys = set()
+                for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+                    for row in rows:
+                        key = tuple(row)
+                        if key in common_keys:
+                            matched_keys.add(key)
+                common_keys = {key: None for key in common_keys if key in matched_keys}
+
+            result_table_name = f"intersect_{'_'.join(table_names)}"
+            self.create_table(result_table_name, {field: self._result_field_info(first_table_info['fields'][field])
+                                                  for field in common_fields})
+            decode = self._row_decoder(first_table_info) or (lambda row: row)
+            self._bulk_insert(result_table_name, common_fields,
+                              (decode(dict(zip(common_fields, key))).values() for key in common_keys))
+
+            print(f"✅ Перетин завершено. Створено таблицю '{result_table_name}' з {len(common_keys)} рядками")
             return result_table_name
 
         except Exception as e:
             print(f"❌ Помилка перетину таблиць: {e}")
             raise
 
-    def save_to_disk(self, filename: str):
-        """Збереження структури бази даних на диск"""
+    def _estimate_row_count(self, table_name: str) -> int:
+        """Оцінка кількості рядків таблиці з каталогу статистики"""
+        return self._stats_entry(table_name)['row_count']
+
+    def _estimate_distinct(self, table_name: str, fields: List[str]) -> int:
+        """Оцінка кількості різних ключів: добуток оцінок полів, але не більше кількості рядків.
+
+        Для планування скетчі не будуються: без готових скетчів оцінкою є кількість рядків (COUNT(*)).
+        """
+        entry = self._stats_entry(table_name)
+        if any(field not in entry['sketches'] for field in fields):
+            return entry['row_count']
+        estimate = 1
+        for field in fields:
+            estimate *= max(entry['sketches'][field].count(), 1)
+        return min(estimate, entry['row_count'])
+
+    def table_stats(self, table_name: str, refresh: bool = False) -> Dict[str, Any]:
+        """Статистика таблиці: кількість рядків і оцінки кількості різних значень кожного поля"""
+        table_info = self._get_table_info(table_name)
+        if not table_info:
+            raise ValueError(f"Table '{table_name}' not found")
+        if refresh:
+            self._stats.pop(table_name, None)
+
+        entry = self._stats_entry(table_name, list(table_info['fields'].keys()))
+        return {
+            'row_count': entry['row_count'],
+            'distinct': {field: min(entry['sketches'][field].count(), entry['row_count'])
+                         for field in table_info['fields']}
+        }
+
+    def _stats_entry(self, table_name: str, fields: Iterable[str] = ()) -> Dict[str, Any]:
+        """Запис каталогу статистики; відсутні кількість рядків і скетчі полів рахуються одним проходом"""
+        entry = self._stats.get(table_name)
+        cursor = self.connection.cursor()
+        if entry is None:
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            entry = self._stats[table_name] = {'row_count': cursor.fetchone()[0], 'sketches': {}}
+
+        missing = [field for field in fields if field not in entry['sketches']]
+        if missing:
+            sketches = {field: HyperLogLog() for field in missing}
+            cursor.execute(f"SELECT {', '.join(missing)} FROM {table_name}")
+            for rows in iter(lambda: cursor.fetchmany(5000), []):
+                for row in rows:
+                    for field, value in zip(missing, row):
+                        sketches[field].add(value)
+            entry['sketches'].update(sketches)
+        return entry
+
+    def _stats_tap(self, table_name: str, columns: List[str], rows: Iterable[List[Any]]):
+        """Потік рядків, що дорогою оновлює скетчі полів таблиці (лише для вже побудованої статистики)"""
+        entry = self._stats.get(table_name)
+        if entry is None:
+            return rows
+        sketches = [(index, entry['sketches'][column]) for index, column in enumerate(columns)
+                    if column in entry['sketches']]
+
+        def tapped():
+            for row in rows:
+                for index, sketch in sketches:
+                    sketch.add(row[index])
+                yield row
+        return tapped()
+
+    def _stats_record_insert(self, table_name: str, columns: List[str], rows: List[List[Any]]):
+        """Інкрементальне оновлення статистики після вставки рядків"""
+        if table_name in self._stats:
+            for _ in self._stats_tap(table_name, columns, rows):
+                pass
+            self._stats[table_name]['row_count'] += len(rows)
+
+    def _stats_record_update(self, table_name: str, columns: List[str], values: List[Any]):
+        """Нові значення оновлених полів потрапляють у скетчі (оцінки лише зростають до перерахунку)"""
+        if table_name in self._stats:
+            for _ in self._stats_tap(table_name, columns, [values]):
+                pass
+
+    def _stats_record_delete(self, table_name: str, count: int):
+        """Зменшення кількості рядків після видалення"""
+        if table_name in self._stats:
+            self._stats[table_name]['row_count'] = max(self._stats[table_name]['row_count'] - count, 0)
+
+    def _bulk_insert(self, table_name: str, columns: List[str], rows: Iterable[Iterable[Any]]) -> int:
+        """Пакетна вставка вже перевірених рядків однією транзакцією"""
+        self._ensure_writable(table_name)
+        cursor = self.connection.cursor()
         try:
-            database_info = {
-                'name': self.name,
-                'tables': self.tables,
-                'enum_definitions': self.enum_definitions
-            }
+            table_info = self._get_table_info(table_name)
+            values = self._stats_tap(table_name, columns,
+                                     (self._encode_values(table_info, columns, row) for row in rows))
+            # Як і в _execute_for_rows, id вставлених рядків збираються лише для сегмента інкрементального збереження
+            track_ids = self._tracks_dirty_rows(table_name)
+            inserted_ids = []
+            if table_info and table_info.get('sharded'):
+                inserted_ids = self._insert_sharded(table_info, columns, values)
+                row_count = len(inserted_ids)
+            else:
+                if track_ids and 'id' in columns:
+                    values = self._collect_ids(values, columns.index('id'), inserted_ids)
+                elif track_ids:
+                    # Нові id йдуть після найбільшого наявного, тож їх можна вибрати після вставки
+                    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table_name}")
+                    (last_id,) = cursor.fetchone()
+                cursor.executemany(
+                    f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['?' for _ in columns])})",
+                    values
+                )
+                row_count = cursor.rowcount
+                if track_ids and 'id' not in columns:
+                    cursor.execute(f"SELECT id FROM {table_name} WHERE id > ?", (last_id,))
+                    inserted_ids = [row[0] for row in cursor.fetchall()]
+            self._commit()
+            if table_name in self._stats:
+                self._stats[table_name]['row_count'] += row_count
+            self._mark_dirty(table_name, inserted_ids if track_ids else None)
+            return row_count
+
+        except sqlite3.Error as e:
+            print(f"❌ Помилка пакетної вставки: {e}")
+            self._rollback()
+            self._stats.pop(table_name, None)
+            raise
+
+    @staticmethod
+    def _collect_ids(rows: Iterable[List[Any]], id_index: int, ids: List[int]):
+        """Передача рядків далі із запам'ятовуванням їх явних id"""
+        for row in rows:
+            ids.append(int(row[id_index]))
+            yield row
+
+    def save_to_disk(self, filename: str, format: str = 'json', block_size: int = 65536):
+        """Збереження бази даних на диск (структура у JSON або повний знімок з даними)"""
+        if format not in ('json', 'snapshot'):
+            raise ValueError(f"Unsupported save format: {format}")
 
-            serializable_info = json.loads(
-                json.dumps(database_info, default=lambda x: x.value if isinstance(x, Enum) else str(x)))
+        try:
+            if format == 'snapshot':
+                self._save_snapshot(filename, block_size)
+            else:
+                database_info = {
+                    'name': self.name,
+                    'tables': self.tables,
+                    'enum_definitions': self.enum_definitions
+                }
 
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(serializable_info, f, indent=2, ensure_ascii=False)
+                # Опис схеми не змінюється під час запису (наприклад, потоком-записувачем)
+                with self._connection_lock, open(filename, 'w', encoding='utf-8') as f:
+                    json.dump(database_info, f, indent=2, ensure_ascii=False,
+                              default=lambda x: x.value if isinstance(x, Enum) else str(x))
 
             print(f"💾 Базу даних збережено у файл: {filename}")
             return True
@@ -324,32 +2622,438 @@ class Database:
             raise
 
     def load_from_disk(self, filename: str):
-        """Завантаження структури бази даних з диску"""
+        """Завантаження бази даних з диску"""
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                database_info = json.load(f)
+            with open(filename, 'rb') as f:
+                is_snapshot = f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
 
-            self.name = database_info['name']
-            self.enum_definitions = database_info.get('enum_definitions', {})
+            self._stats = {}
+            if is_snapshot:
+                self._load_snapshot(filename)
+            else:
+                with open(filename, 'r', encoding='utf-8') as f:
+                    database_info = json.load(f)
+
+                self.name = database_info['name']
+                self.enum_definitions = database_info.get('enum_definitions', {})
+                self.tables = [self._restore_table_info(table_info) for table_info in database_info['tables']]
+                self._enum_codes = {}
+                self._enum_values = {}
+                for enum_name in self.enum_definitions:
+                    self._sync_enum_codes(enum_name)
+                if self.connection:
+                    self._restore_shards()
 
-            self.tables = []
-            for table_info in database_info['tables']:
-                restored_table = {
-                    'name': table_info['name'],
-                    'fields': {}
-                }
+            print(f"📂 Базу даних завантажено з файлу: {filename}")
+            return True
 
-                for field_name, field_data in table_info['fields'].items():
-                    restored_table['fields'][field_name] = {
-                        'type': DataType(field_data['type']),
-                        'enum_name': field_data.get('enum_name')
-                    }
+        except Exception as e:
+            print(f"❌ Помилка завантаження: {e}")
+            raise
 
-                self.tables.append(restored_table)
+    def sync_schema_from(self, source: 'Database'):
+        """Перенесення опису схеми з іншого об'єкта тієї ж бази (з'єднання пулу читачів)"""
+        # Глибока копія під блокуванням джерела: його записи змінюють описи таблиць на місці
+        with source._connection_lock:
+            self.tables = copy.deepcopy(source.tables)
+            self.enum_definitions = copy.deepcopy(source.enum_definitions)
+            self._enum_codes = copy.deepcopy(source._enum_codes)
+            self._enum_values = copy.deepcopy(source._enum_values)
+        self._stats = {}
+        if self.connection:
+            self._restore_shards()
+
+    @staticmethod
+    def _restore_table_info(table_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Відновлення опису таблиці з серіалізованого вигляду"""
+        restored_table = {
+            'name': table_info['name'],
+            'fields': {}
+        }
+
+        for field_name, field_data in table_info['fields'].items():
+            restored_table['fields'][field_name] = {
+                'type': DataType(field_data['type']),
+                'enum_name': field_data.get('enum_name')
+            }
+            if restored_table['fields'][field_name]['type'] == DataType.ENUM:
+                # Описи без позначки походять зі схем, де переліки зберігалися текстом
+                restored_table['fields'][field_name]['encoded'] = field_data.get('encoded', False)
+            if field_data.get('fts'):
+                restored_table['fields'][field_name]['fts'] = field_data['fts']
+
+        if table_info.get('virtual'):
+            restored_table['virtual'] = True
+            restored_table['query'] = table_info['query']
+        if table_info.get('maintained'):
+            restored_table['maintained'] = table_info['maintained']
+        if table_info.get('sharded'):
+            restored_table['sharded'] = table_info['sharded']
+
+        return restored_table
+
+    def save_incremental(self, filename: str, compact_every: int = 16, block_size: int = 65536):
+        """Інкрементальне збереження: лише змінені частини дописуються окремим сегментом"""
+        if compact_every <= 0:
+            raise ValueError("Compaction interval must be positive")
 
-            print(f"📂 Базу даних завантажено з файлу: {filename}")
+        try:
+            segments_path = f"{filename}.segments"
+            if (self._snapshot_path != filename or not os.path.exists(filename)
+                    or self._count_segments(segments_path) + 1 >= compact_every):
+                # Ущільнення: повний знімок замість базового файлу та всіх сегментів
+                self._save_snapshot(filename, block_size)
+                print(f"💾 Базу даних ущільнено у файл: {filename}")
+                return True
+
+            if not (self._dirty_enums or self._dirty_tables or self._dirty_rows or self._dropped_tables):
+                print("💾 Змін для збереження немає")
+                return True
+
+            self._append_segment(segments_path, block_size)
+            self._clear_dirty(filename)
+            print(f"💾 Зміни дописано у сегмент: {segments_path}")
             return True
 
         except Exception as e:
-            print(f"❌ Помилка завантаження: {e}")
+            print(f"❌ Помилка інкрементального збереження: {e}")
             raise
+
+    def _save_snapshot(self, filename: str, block_size: int):
+        """Запис знімка: заголовок зі схемою, далі блоки колонок кожної таблиці"""
+        if not self.connection:
+            raise ValueError("Database not connected")
+
+        header = self._serialize_header({
+            'name': self.name,
+            'tables': self.tables,
+            'enum_definitions': self.enum_definitions,
+            'enum_codes': {name: self._enum_code_map(name) for name in self.enum_definitions}
+        })
+
+        cursor = self.connection.cursor()
+        with open(filename, 'wb', buffering=1024 * 1024) as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(header)
+            for table_info in self.tables:
+                self._write_table_blocks(f, cursor, table_info, block_size)
+
+        segments_path = f"{filename}.segments"
+        if os.path.exists(segments_path):
+            os.remove(segments_path)
+        self._clear_dirty(filename)
+
+    def _append_segment(self, segments_path: str, block_size: int):
+        """Дописування сегмента зі зміненими переліками, таблицями та рядками"""
+        cursor = self.connection.cursor()
+        full_tables = [table for table in self.tables if table['name'] in self._dirty_tables]
+        row_tables = [table for table in self.tables if table['name'] in self._dirty_rows]
+
+        existing_ids = {}
+        deleted = {}
+        for table_info in row_tables:
+            ids = sorted(self._dirty_rows[table_info['name']])
+            found = set()
+            for start in range(0, len(ids), SQL_VARIABLE_CHUNK):
+                chunk = ids[start:start + SQL_VARIABLE_CHUNK]
+                cursor.execute(f"SELECT id FROM {table_info['name']} "
+                               f"WHERE id IN ({', '.join(['?' for _ in chunk])})", chunk)
+                found.update(row[0] for row in cursor.fetchall())
+            existing_ids[table_info['name']] = sorted(found)
+            deleted[table_info['name']] = [row_id for row_id in ids if row_id not in found]
+
+        segment = io.BytesIO()
+        segment.write(SEGMENT_MAGIC)
+        segment.write(self._serialize_header({
+            'enum_definitions': {name: self.enum_definitions[name]
+                                 for name in self._dirty_enums if name in self.enum_definitions},
+            'enum_codes': {name: self._enum_code_map(name)
+                           for name in self._dirty_enums if name in self.enum_definitions},
+            'dropped': sorted(self._dropped_tables),
+            'full_tables': full_tables,
+            'row_tables': [table['name'] for table in row_tables],
+            'deleted': deleted
+        }))
+        for table_info in full_tables:
+            self._write_table_blocks(segment, cursor, table_info, block_size)
+        for table_info in row_tables:
+            self._write_table_blocks(segment, cursor, table_info, block_size, existing_ids[table_info['name']])
+
+        with open(segments_path, 'ab') as f:
+            f.write(struct.pack('<Q', segment.tell()))
+            f.write(segment.getbuffer())
+
+    @staticmethod
+    def _count_segments(segments_path: str) -> int:
+        """Підрахунок сегментів у файлі змін (без читання їх вмісту)"""
+        if not os.path.exists(segments_path):
+            return 0
+
+        count = 0
+        with open(segments_path, 'rb') as f:
+            while True:
+                length_bytes = f.read(8)
+                if len(length_bytes) < 8:
+                    return count
+                (length,) = struct.unpack('<Q', length_bytes)
+                f.seek(length, os.SEEK_CUR)
+                count += 1
+
+    @staticmethod
+    def _serialize_header(header: Dict[str, Any]) -> bytes:
+        """Серіалізація JSON-заголовка з префіксом довжини"""
+        encoded = json.dumps(header, ensure_ascii=False,
+                             default=lambda x: x.value if isinstance(x, Enum) else str(x)).encode('utf-8')
+        return struct.pack('<I', len(encoded)) + encoded
+
+    @staticmethod
+    def _read_header(buffer, offset: int):
+        """Читання JSON-заголовка, повертає заголовок та нове зміщення"""
+        (header_len,) = struct.unpack_from('<I', buffer, offset)
+        offset += 4
+        header = json.loads(bytes(buffer[offset:offset + header_len]).decode('utf-8'))
+        return header, offset + header_len
+
+    def _write_table_blocks(self, f, cursor, table_info: Dict[str, Any], block_size: int,
+                            ids: Optional[List[int]] = None):
+        """Запис рядків таблиці (усіх або лише заданих id) блоками колонок"""
+        if table_info.get('virtual'):
+            # Представлення не зберігає власних рядків - лише визначення у заголовку
+            f.write(struct.pack('<I', 0))
+            return
+
+        columns = ['id'] + list(table_info['fields'].keys())
+        field_types = [DataType.INTEGER] + [field['type'] for field in table_info['fields'].values()]
+        select_query = f"SELECT {', '.join(columns)} FROM {table_info['name']}"
+
+        if ids is None:
+            cursor.execute(f"{select_query} ORDER BY id")
+            blocks = iter(lambda: cursor.fetchmany(block_size), [])
+        else:
+            def fetch_chunks():
+                for start in range(0, len(ids), block_size):
+                    chunk = ids[start:start + block_size]
+                    for part in range(0, len(chunk), 500):
+                        id_part = chunk[part:part + 500]
+                        cursor.execute(f"{select_query} WHERE id IN ({', '.join(['?' for _ in id_part])})",
+                                       id_part)
+                        rows = cursor.fetchall()
+                        if rows:
+                            yield rows
+            blocks = fetch_chunks()
+
+        for rows in blocks:
+            f.write(struct.pack('<I', len(rows)))
+            for index, field_type in enumerate(field_types):
+                f.write(self._encode_column([row[index] for row in rows], field_type))
+
+        # Блок з нульовою кількістю рядків завершує таблицю
+        f.write(struct.pack('<I', 0))
+
+    def _read_table_blocks(self, buffer, offset: int, table_info: Dict[str, Any], replace: bool = False):
+        """Вставка блоків колонок таблиці пакетами, повертає нове зміщення"""
+        columns = ['id'] + list(table_info['fields'].keys())
+        insert_query = self._insert_query(table_info['name'], columns, replace)
+        cursor = self.connection.cursor()
+
+        while True:
+            (row_count,) = struct.unpack_from('<I', buffer, offset)
+            offset += 4
+            if row_count == 0:
+                return offset
+
+            column_values = []
+            for _ in columns:
+                values, offset = self._decode_column(buffer, offset, row_count)
+                column_values.append(values)
+            if table_info.get('sharded'):
+                self._insert_sharded(table_info, columns, zip(*column_values), replace)
+            else:
+                cursor.executemany(insert_query, zip(*column_values))
+
+    def _recreate_table(self, table_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Створення таблиці (або представлення) з нуля за серіалізованим описом"""
+        restored_table = self._restore_table_info(table_info)
+        table_name = restored_table['name']
+
+        if restored_table.get('sharded'):
+            self._attach_shards(restored_table['sharded']['shards'])
+        existing = self._get_table_info(table_name)
+        if self._change_log and existing and not existing.get('virtual'):
+            self._log_change(table_name, 'drop_table', None)
+        self._drop_relation(table_name)
+
+        self.tables = [table for table in self.tables if table['name'] != table_name]
+        if restored_table.get('virtual'):
+            self._create_view(table_name, restored_table['query'], restored_table['fields'])
+        else:
+            sharding = restored_table.get('sharded') or {}
+            self.create_table(table_name, restored_table['fields'], shards=sharding.get('shards'),
+                              shard_key=sharding.get('key'))
+            if restored_table.get('maintained'):
+                self._get_table_info(table_name)['maintained'] = restored_table['maintained']
+        return restored_table
+
+    def _drop_relation(self, table_name: str):
+        """Видалення таблиці чи представлення з бази та з усіх приєднаних шардів"""
+        cursor = self.connection.cursor()
+        cursor.execute("PRAGMA database_list")
+        for schema in [row[1] for row in cursor.fetchall()]:
+            master = 'sqlite_temp_master' if schema == 'temp' else f"{schema}.sqlite_master"
+            cursor.execute(f"SELECT type FROM {master} WHERE name = ? AND type IN ('table', 'view')", (table_name,))
+            existing = cursor.fetchone()
+            if existing:
+                cursor.execute(f"DROP {'VIEW' if existing[0] == 'view' else 'TABLE'} {schema}.{table_name}")
+        # Повнотекстові індекси не зникають разом з таблицею-джерелом
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ? ESCAPE '\\' "
+                       "AND sql LIKE 'CREATE VIRTUAL TABLE%'", (table_name.replace('_', '\\_') + '\\_\\_fts\\_%',))
+        for (fts_table,) in cursor.fetchall():
+            cursor.execute(f"DROP TABLE {fts_table}")
+        self._shard_next_ids.pop(table_name, None)
+        self._stats.pop(table_name, None)
+
+    def _load_snapshot(self, filename: str):
+        """Відновлення схеми та даних зі знімка через memory-map і пакетні вставки"""
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            database_info, offset = self._read_header(mm, len(SNAPSHOT_MAGIC))
+
+            if not self.connection and not self.connect():
+                raise ValueError("Database not connected")
+
+            self.enum_definitions = database_info.get('enum_definitions', {})
+            self.tables = []
+            self._enum_codes = {}
+            self._enum_values = {}
+            for enum_name in self.enum_definitions:
+                self._sync_enum_codes(enum_name, database_info.get('enum_codes', {}).get(enum_name))
+
+            for table_info in database_info['tables']:
+                restored_table = self._recreate_table(table_info)
+                offset = self._read_table_blocks(mm, offset, restored_table)
+
+        segments_path = f"{filename}.segments"
+        if os.path.exists(segments_path) and os.path.getsize(segments_path) > 0:
+            self._apply_segments(segments_path)
+
+        # Тригери зникають разом з перествореними таблицями, тому встановлюються наново
+        for table_info in self.tables:
+            if table_info.get('maintained'):
+                self._install_intersection_maintenance(table_info)
+
+        self.connection.commit()
+        self._clear_dirty(filename)
+
+    def _apply_segments(self, segments_path: str):
+        """Накладання сегментів змін поверх відновленого знімка"""
+        with open(segments_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            position = 0
+            while position + 8 <= len(mm):
+                (length,) = struct.unpack_from('<Q', mm, position)
+                offset = position + 8
+                position = offset + length
+                if mm[offset:offset + len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                    raise ValueError(f"Corrupted segment in {segments_path}")
+
+                segment, offset = self._read_header(mm, offset + len(SEGMENT_MAGIC))
+                self.enum_definitions.update(segment['enum_definitions'])
+                for enum_name in segment['enum_definitions']:
+                    self._sync_enum_codes(enum_name, segment.get('enum_codes', {}).get(enum_name))
+
+                for table_name in segment.get('dropped', []):
+                    self._drop_relation(table_name)
+                    self.tables = [table for table in self.tables if table['name'] != table_name]
+
+                for table_info in segment['full_tables']:
+                    restored_table = self._recreate_table(table_info)
+                    offset = self._read_table_blocks(mm, offset, restored_table)
+
+                cursor = self.connection.cursor()
+                for table_name in segment['row_tables']:
+                    deleted_ids = segment['deleted'].get(table_name, [])
+                    for row_id in deleted_ids:
+                        cursor.execute(f"DELETE FROM {self._table_for_row(table_name, row_id)} WHERE id = ?",
+                                       (row_id,))
+                    offset = self._read_table_blocks(mm, offset, self._get_table_info(table_name), replace=True)
+                    self._stats.pop(table_name, None)
+
+    @staticmethod
+    def _encode_column(values: List[Any], field_type: DataType) -> bytes:
+        """Кодування колонки блоку: тип, бітова маска NULL, типізовані дані"""
+        count = len(values)
+        null_mask = bytearray((count + 7) // 8)
+        present = []
+        for index, value in enumerate(values):
+            if value is None:
+                null_mask[index // 8] |= 1 << (index % 8)
+            else:
+                present.append(value)
+
+        def fits_int(value):
+            return isinstance(value, int) and -2 ** 63 <= value < 2 ** 63
+
+        encoding = COLUMN_TEXT
+        numbers = None
+        try:
+            if all(fits_int(value) for value in present):
+                encoding, numbers = COLUMN_INT, present
+            elif field_type == DataType.INTEGER and all(isinstance(value, str) for value in present):
+                numbers = [int(value) for value in present]
+                if all(fits_int(number) and str(number) == value for number, value in zip(numbers, present)):
+                    encoding = COLUMN_INT_TEXT
+            elif field_type == DataType.REAL and all(isinstance(value, str) for value in present):
+                numbers = [float(value) for value in present]
+                if all(str(number) == value for number, value in zip(numbers, present)):
+                    encoding = COLUMN_REAL_TEXT
+        except ValueError:
+            encoding = COLUMN_TEXT
+
+        parts = [struct.pack('<B', encoding), bytes(null_mask)]
+        if encoding in (COLUMN_INT, COLUMN_INT_TEXT):
+            parts.append(struct.pack(f'<{len(numbers)}q', *numbers))
+        elif encoding == COLUMN_REAL_TEXT:
+            parts.append(struct.pack(f'<{len(numbers)}d', *numbers))
+        else:
+            encoded = [str(value).encode('utf-8') for value in present]
+            ends = []
+            position = 0
+            for item in encoded:
+                position += len(item)
+                ends.append(position)
+            parts.append(struct.pack('<I', len(encoded)))
+            parts.append(struct.pack(f'<{len(ends)}I', *ends))
+            parts.append(b''.join(encoded))
+
+        return b''.join(parts)
+
+    @staticmethod
+    def _decode_column(buffer, offset: int, count: int):
+        """Декодування колонки блоку, повертає значення та нове зміщення"""
+        (encoding,) = struct.unpack_from('<B', buffer, offset)
+        offset += 1
+        mask_len = (count + 7) // 8
+        null_mask = buffer[offset:offset + mask_len]
+        offset += mask_len
+        nulls = [bool(null_mask[index // 8] & (1 << (index % 8))) for index in range(count)]
+        present_count = count - sum(nulls)
+
+        if encoding in (COLUMN_INT, COLUMN_INT_TEXT, COLUMN_REAL_TEXT):
+            code = 'd' if encoding == COLUMN_REAL_TEXT else 'q'
+            present = struct.unpack_from(f'<{present_count}{code}', buffer, offset)
+            offset += 8 * present_count
+            if encoding != COLUMN_INT:
+                present = [str(value) for value in present]
+        else:
+            (item_count,) = struct.unpack_from('<I', buffer, offset)
+            offset += 4
+            ends = struct.unpack_from(f'<{item_count}I', buffer, offset)
+            offset += 4 * item_count
+            present = []
+            start = 0
+            for end in ends:
+                present.append(buffer[offset + start:offset + end].decode('utf-8'))
+                start = end
+            offset += start
+
+        present_iter = iter(present)
+        values = [None if is_null else next(present_iter) for is_null in nulls]
+        return values, offset
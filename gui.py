@@ -1,3 +1,4 @@
+import os
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from typing import List
@@ -106,26 +107,10 @@ class DatabaseGUI:
             try:
                 self.current_db = Database(db_name)
                 if self.current_db.connect():
-                    # Отримуємо список таблиць з бази даних
-                    cursor = self.current_db.connection.cursor()
-                    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name != 'sqlite_sequence'")
-                    tables = cursor.fetchall()
-
-                    self.current_db.tables = []
-                    for table in tables:
-                        # Отримуємо інформацію про поля таблиці
-                        cursor.execute(f"PRAGMA table_info({table[0]})")
-                        columns = cursor.fetchall()
-                        fields = {}
-                        for col in columns:
-                            if col[1] != 'id':  # Пропускаємо поле id
-                                # Для спрощення вважаємо всі поля STRING
-                                fields[col[1]] = {'type': DataType.STRING}
-
-                        self.current_db.tables.append({
-                            'name': table[0],
-                            'fields': fields
-                        })
+                    if os.path.exists(self.current_db.schema_path):
+                        self.current_db.load_from_disk(self.current_db.schema_path)
+                    else:
+                        self.restore_schema_from_file()
 
                     self.refresh_tables_list()
                     self.status_var.set(f"Базу даних '{db_name}' відкрито")
@@ -135,6 +120,53 @@ class DatabaseGUI:
             except Exception as e:
                 messagebox.showerror("Помилка", f"Не вдалося відкрити базу даних: {str(e)}")
 
+    def restore_schema_from_file(self):
+        """Відновлення схеми за самим файлом бази, якщо збереженого опису схеми немає"""
+        cursor = self.current_db.connection.cursor()
+
+        # Переліки відновлюються з таблиць-довідників кодів
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'enum\\_%\\_\\_codes' ESCAPE '\\'")
+        for (lookup_table,) in cursor.fetchall():
+            cursor.execute(f"SELECT value FROM {lookup_table} ORDER BY code")
+            values = [value for (value,) in cursor.fetchall()]
+            if values:
+                self.current_db.define_enum(lookup_table[len('enum_'):-len('__codes')], values)
+
+        # Отримуємо список таблиць з бази даних
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name != 'sqlite_sequence' "
+                       "AND name NOT LIKE 'enum\\_%\\_\\_codes' ESCAPE '\\' "
+                       "AND name NOT LIKE '%\\_\\_fts\\_%' ESCAPE '\\' "
+                       "AND name NOT LIKE '%\\_\\_counts' ESCAPE '\\' AND name != '__changes'")
+        tables = cursor.fetchall()
+
+        self.current_db.tables = []
+        for table in tables:
+            # Отримуємо інформацію про поля таблиці
+            cursor.execute(f"PRAGMA table_info({table[0]})")
+            columns = cursor.fetchall()
+            fields = {}
+            for col in columns:
+                if col[1] == 'id':  # Пропускаємо поле id
+                    continue
+                if col[2].upper() == 'INTEGER':
+                    # Цілими зберігаються лише коди переліків; перелік шукаємо за назвою поля
+                    if col[1] in self.current_db.enum_definitions:
+                        fields[col[1]] = {'type': DataType.ENUM, 'enum_name': col[1], 'encoded': True}
+                    else:
+                        fields[col[1]] = {'type': DataType.INTEGER}
+                else:
+                    # Для спрощення вважаємо решту полів STRING
+                    fields[col[1]] = {'type': DataType.STRING}
+
+            self.current_db.tables.append({
+                'name': table[0],
+                'fields': fields
+            })
+
+    def save_schema(self):
+        """Збереження опису схеми поруч із файлом бази, щоб відкрити її з тими ж типами полів"""
+        self.current_db.save_to_disk(self.current_db.schema_path)
+
     def close_database(self):
         """Закриття бази даних"""
         if self.current_db:
@@ -160,6 +192,7 @@ class DatabaseGUI:
                 values = [v.strip() for v in values_str.split(',') if v.strip()]
                 try:
                     self.current_db.define_enum(enum_name, values)
+                    self.save_schema()
                     self.status_var.set(f"Перелічуваний тип '{enum_name}' визначено")
                     messagebox.showinfo("Успіх", f"Перелічуваний тип '{enum_name}' визначено успішно!")
                 except Exception as e:
@@ -177,6 +210,7 @@ class DatabaseGUI:
             if fields:
                 try:
                     self.current_db.create_table(table_name, fields)
+                    self.save_schema()
                     self.refresh_tables_list()
                     self.status_var.set(f"Таблицю '{table_name}' створено успішно")
                 except Exception as e:
@@ -285,6 +319,7 @@ class DatabaseGUI:
             if messagebox.askyesno("Підтвердження", f"Видалити таблицю '{table_name}'?"):
                 try:
                     self.current_db.delete_table(table_name)
+                    self.save_schema()
                     self.refresh_tables_list()
                     self.clear_data_table()
                     self.status_var.set(f"Таблицю '{table_name}' видалено успішно")
@@ -322,12 +357,37 @@ class DatabaseGUI:
                 # Додавання даних
                 for row in rows:
                     values = [row[col] for col in columns]
-                    self.tree.insert('', tk.END, text=row.get('id', ''), values=values)
+                    # id рядка слугує ідентифікатором елемента, щоб після змін оновлювати лише його
+                    iid = str(row['id']) if 'id' in row else None
+                    self.tree.insert('', tk.END, iid=iid, text=row.get('id', ''), values=values)
 
             self.status_var.set(f"Відображено {len(rows)} рядків з таблиці '{table_name}'")
         except Exception as e:
             messagebox.showerror("Помилка", f"Не вдалося завантажити дані: {str(e)}")
 
+    def update_tree_rows(self, table_name, row_ids):
+        """Оновлення лише змінених рядків у таблиці даних (додані, змінені, видалені) без повного перезавантаження"""
+        if not self.tree['columns']:
+            # Колонки ще не налаштовані (таблиця була порожньою), тому потрібне повне відображення
+            self.display_table_data(table_name)
+            return
+
+        columns = self.tree['columns']
+        found = self.current_db.get_rows_by_ids(table_name, row_ids)['rows']
+        for row_id in row_ids:
+            iid = str(row_id)
+            row = found.get(row_id)
+            if row is None:
+                if self.tree.exists(iid):
+                    self.tree.delete(iid)
+            elif self.tree.exists(iid):
+                self.tree.item(iid, values=[row[col] for col in columns])
+            else:
+                # Новий рядок додається в кінець, тож прокрутка і виділення не змінюються
+                self.tree.insert('', tk.END, iid=iid, text=row_id, values=[row[col] for col in columns])
+
+        self.status_var.set(f"Відображено {len(self.tree.get_children())} рядків з таблиці '{table_name}'")
+
     def clear_data_table(self):
         """Очищення таблиці даних"""
         for item in self.tree.get_children():
@@ -367,7 +427,7 @@ class DatabaseGUI:
             if data:
                 try:
                     row_id = self.current_db.add_row(table_name, data)
-                    self.display_table_data(table_name)
+                    self.update_tree_rows(table_name, [row_id])
                     self.status_var.set(f"Рядок додано успішно (ID: {row_id})")
                     messagebox.showinfo("Успіх", "Рядок додано успішно!")
                 except Exception as e:
@@ -411,7 +471,7 @@ class DatabaseGUI:
             try:
                 success = self.current_db.update_row(table_name, int(row_id), new_data)
                 if success:
-                    self.display_table_data(table_name)
+                    self.update_tree_rows(table_name, [int(row_id)])
                     self.status_var.set(f"Рядок з ID {row_id} успішно оновлено")
                     messagebox.showinfo("Успіх", "Рядок оновлено успішно!")
                 else:
@@ -420,34 +480,36 @@ class DatabaseGUI:
                 messagebox.showerror("Помилка", f"Не вдалося оновити рядок: {str(e)}")
 
     def delete_row(self):
-        """Видалення вибраного рядка"""
+        """Видалення вибраних рядків"""
         if not self.current_db:
             messagebox.showwarning("Увага", "Спочатку створіть або відкрийте базу даних")
             return
 
         selected_table = self.tables_listbox.curselection()
-        selected_row = self.tree.selection()
+        selected_rows = self.tree.selection()
 
-        if not selected_table or not selected_row:
+        if not selected_table or not selected_rows:
             messagebox.showwarning("Увага", "Виберіть таблицю та рядок для видалення")
             return
 
         table_name = self.tables_listbox.get(selected_table[0])
-        row_id = self.tree.item(selected_row[0])['text']
+        row_ids = [int(self.tree.item(item)['text']) for item in selected_rows]
 
-        print(f"🗑️ Спроба видалити рядок з ID: {row_id} з таблиці: {table_name}")
+        print(f"🗑️ Спроба видалити рядки з ID: {row_ids} з таблиці: {table_name}")
 
-        if messagebox.askyesno("Підтвердження", f"Видалити рядок з ID {row_id} з таблиці '{table_name}'?"):
+        question = (f"Видалити рядок з ID {row_ids[0]} з таблиці '{table_name}'?" if len(row_ids) == 1
+                    else f"Видалити {len(row_ids)} рядків з таблиці '{table_name}'?")
+        if messagebox.askyesno("Підтвердження", question):
             try:
-                success = self.current_db.delete_row(table_name, int(row_id))
-                if success:
-                    self.display_table_data(table_name)
-                    self.status_var.set(f"Рядок з ID {row_id} успішно видалено")
-                    messagebox.showinfo("Успіх", "Рядок видалено успішно!")
+                deleted = self.current_db.delete_rows(table_name, ids=row_ids)
+                if deleted:
+                    self.update_tree_rows(table_name, row_ids)
+                    self.status_var.set(f"Видалено рядків: {deleted}")
+                    messagebox.showinfo("Успіх", f"Видалено рядків: {deleted}")
                 else:
-                    messagebox.showerror("Помилка", f"Рядок з ID {row_id} не знайдено")
+                    messagebox.showerror("Помилка", "Вибрані рядки не знайдено")
             except Exception as e:
-                messagebox.showerror("Помилка", f"Не вдалося видалити рядок: {str(e)}")
+                messagebox.showerror("Помилка", f"Не вдалося видалити рядки: {str(e)}")
 
     def get_row_data(self, fields, initial_data=None):
         """Діалог для введення даних рядка"""
@@ -579,6 +641,7 @@ class DatabaseGUI:
 
         try:
             result_table = self.current_db.intersect_tables(table1, table2, selected_fields)
+            self.save_schema()
             self.refresh_tables_list()
             self.status_var.set(f"Створено таблицю перетину: {result_table}")
             messagebox.showinfo("Успіх", f"Перетин таблиць завершено!\nСтворено таблицю: {result_table}")
@@ -1,10 +1,18 @@
-import tkinter as tk
-from gui import DatabaseGUI
+import sys
+
 
 def main():
+    # З аргументами командного рядка працюємо без GUI, щоб не завантажувати Tk
+    if len(sys.argv) > 1:
+        import cli
+        sys.exit(cli.main())
+
+    import tkinter as tk
+    from gui import DatabaseGUI
+
     root = tk.Tk()
     app = DatabaseGUI(root)
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
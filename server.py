@@ -0,0 +1,354 @@
+"""Локальний мережевий сервер запитів до бази даних з пулом з'єднань
+
+Протокол: кожен кадр - 4 байти довжини (big-endian) і JSON тіло.
+    запит:   {"id": 1, "op": "add_row", "args": ["users", {"name": "Ann"}], "kwargs": {}}
+    відповідь: {"id": 1, "ok": true, "result": 5} або {"id": 1, "ok": false, "error": "ValueError", "message": "..."}
+
+Відповіді зіставляються із запитами за id, тому клієнт може надсилати запити конвеєром,
+не чекаючи попередніх відповідей. Запис виконує один потік-записувач з груповою фіксацією,
+читання - пул з'єднань у режимі WAL.
+
+Порядок у межах з'єднання: записи потрапляють до записувача в порядку надходження, а читання
+чекає на фіксацію всіх записів, надісланих раніше тим самим з'єднанням, тож бачить їх результат.
+Між різними з'єднаннями порядок не гарантується.
+
+Приклади:
+    python -m server shop --port 8765
+    python -m server shop --unix /tmp/shop.sock --pool-size 8
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from database import Database, DataType, WRITER_OPERATIONS, decode_operation_arguments
+
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+READ_OPERATIONS = ('get_row_by_id', 'get_rows', 'get_rows_by_ids', 'search', 'aggregate', 'table_stats',
+                   'set_operation', 'union_tables', 'difference_tables', 'semi_join', 'anti_join',
+                   'changes_since', 'last_change_seq')
+SCHEMA_OPERATIONS = ('create_table', 'define_enum', 'delete_table', 'intersect_tables', 'intersect_many')
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """Читання одного кадру; None - з'єднання закрито"""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {length} bytes exceeds the limit")
+    return json.loads(await reader.readexactly(length))
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    """Кодування повідомлення у кадр"""
+    body = json.dumps(message, ensure_ascii=False, separators=(',', ':'),
+                      default=lambda value: value.value if isinstance(value, DataType) else str(value)).encode('utf-8')
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+class DatabaseServer:
+    """Сервер, що приймає кадри з TCP або Unix-сокета і розподіляє їх між записувачем і пулом читачів"""
+
+    def __init__(self, db_name: str, host: str = '127.0.0.1', port: int = 8765, unix_path: Optional[str] = None,
+                 pool_size: int = 4, max_in_flight: int = 64):
+        if pool_size <= 0 or max_in_flight <= 0:
+            raise ValueError("Pool size and in-flight limit must be positive")
+        self.db_name = db_name
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.pool_size = pool_size
+        self.max_in_flight = max_in_flight
+        self.writer = None
+        self._server = None
+        self._readers = None
+        self._reader_versions = {}
+        self._read_executor = None
+        self._schema_version = 0
+
+    async def start(self):
+        """Відкриття бази, пулу читачів і сокета"""
+        # WAL дозволяє читачам працювати паралельно з груповою фіксацією записувача
+        self.writer = Database(self.db_name, profile='balanced')
+        if not self.writer.connect():
+            raise RuntimeError(f"Cannot connect to database '{self.db_name}'")
+        if os.path.exists(self.writer.schema_path):
+            self.writer.load_from_disk(self.writer.schema_path)
+        self.writer.start_writer()
+
+        self._readers = asyncio.Queue()
+        for _ in range(self.pool_size):
+            reader = Database(self.db_name, profile='balanced')
+            if not reader.connect():
+                raise RuntimeError(f"Cannot connect to database '{self.db_name}'")
+            reader.sync_schema_from(self.writer)
+            self._reader_versions[reader] = self._schema_version
+            self._readers.put_nowait(reader)
+        self._read_executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix=f"{self.db_name}-reader")
+
+        if self.unix_path:
+            self._server = await asyncio.start_unix_server(self._handle_client, path=self.unix_path)
+            print(f"🌐 Сервер слухає {self.unix_path}")
+        else:
+            self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+            print(f"🌐 Сервер слухає {self.host}:{self.port}")
+
+    async def stop(self):
+        """Закриття сокета, пулу читачів і записувача"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._read_executor:
+            self._read_executor.shutdown(wait=True)
+            self._read_executor = None
+        for reader in self._reader_versions:
+            reader.disconnect()
+        self._reader_versions = {}
+        if self.writer:
+            self.writer.save_to_disk(self.writer.schema_path)
+            self.writer.disconnect()
+            self.writer = None
+        if self.unix_path and os.path.exists(self.unix_path):
+            os.remove(self.unix_path)
+        print("🌐 Сервер зупинено")
+
+    async def serve_forever(self):
+        """Обслуговування клієнтів до скасування задачі"""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Обслуговування одного клієнта: запити виконуються паралельно, відповіді надсилаються по готовності"""
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        send_lock = asyncio.Lock()
+        tasks = set()
+        pending_writes = set()
+
+        async def respond(request, after):
+            try:
+                if after:
+                    # Читання бачить записи, надіслані раніше цим з'єднанням
+                    await asyncio.wait(after)
+                response = await self.execute(request)
+                async with send_lock:
+                    writer.write(encode_frame(response))
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                in_flight.release()
+
+        try:
+            while True:
+                request = await read_frame(reader)
+                if request is None:
+                    break
+                await in_flight.acquire()
+                operation = request.get('op') if isinstance(request, dict) else None
+                after = list(pending_writes) if operation in READ_OPERATIONS else []
+                task = asyncio.ensure_future(respond(request, after))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                if operation in WRITER_OPERATIONS:
+                    pending_writes.add(task)
+                    task.add_done_callback(pending_writes.discard)
+        except (ConnectionError, ValueError) as e:
+            print(f"❌ Помилка з'єднання з клієнтом: {e}")
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def execute(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Виконання одного запиту; помилки повертаються клієнту, а не обривають з'єднання"""
+        request_id = None
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            request_id = request.get('id')
+            operation = request.get('op')
+            args, kwargs = decode_operation_arguments(operation, request.get('args', []), request.get('kwargs', {}))
+            if operation in WRITER_OPERATIONS:
+                result = await self._write(operation, args, kwargs)
+            elif operation in READ_OPERATIONS:
+                result = await self._read(operation, args, kwargs)
+            else:
+                raise ValueError(f"Unsupported operation: {operation}")
+            return {'id': request_id, 'ok': True, 'result': result}
+        except Exception as e:
+            return {'id': request_id, 'ok': False, 'error': type(e).__name__, 'message': str(e)}
+
+    async def _write(self, operation: str, args: List[Any], kwargs: Dict[str, Any]):
+        """Запис через потік-записувач: одночасні запити клієнтів фіксуються спільною транзакцією"""
+        if operation in ('intersect_tables', 'import_file') and (kwargs.get('workers') or 0) > 1:
+            raise ValueError("Parallel execution is not available through the server")
+        result = await asyncio.wrap_future(self.writer.submit(operation, *args, **kwargs))
+        if operation in SCHEMA_OPERATIONS:
+            self._schema_version += 1
+            # Збереження чекає на блокування з'єднання записувача, тому виконується поза циклом подій
+            await asyncio.get_running_loop().run_in_executor(None, self.writer.save_to_disk, self.writer.schema_path)
+        return result
+
+    async def _read(self, operation: str, args: List[Any], kwargs: Dict[str, Any]):
+        """Читання на вільному з'єднанні пулу"""
+        if kwargs.get('materialize') or kwargs.get('as_view'):
+            raise ValueError("Materialized set operations go through intersect_tables")
+        if operation == 'table_stats':
+            # Каталог читача не бачить змін записувача, тому статистика перераховується
+            kwargs['refresh'] = True
+
+        reader = await self._readers.get()
+        try:
+            # Схема читача оновлюється лише після змін схеми записувачем
+            schema_version = self._schema_version if self._reader_versions[reader] != self._schema_version else None
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._read_executor, self._run_read, reader, schema_version,
+                                              operation, args, kwargs)
+        finally:
+            self._readers.put_nowait(reader)
+
+    def _run_read(self, reader: Database, schema_version: Optional[int], operation: str, args: List[Any],
+                  kwargs: Dict[str, Any]):
+        """Виконання читання в потоці пулу; потокові результати збираються у список"""
+        if schema_version is not None:
+            # Знімок схеми робиться під блокуванням записувача, тому синхронізація не виконується в циклі подій
+            reader.sync_schema_from(self.writer)
+            self._reader_versions[reader] = schema_version
+        result = getattr(reader, operation)(*args, **kwargs)
+        if operation in ('changes_since', 'set_operation', 'union_tables', 'difference_tables',
+                         'semi_join', 'anti_join'):
+            return list(result)
+        return result
+
+
+class DatabaseClient:
+    """Клієнт сервера з конвеєризацією: кілька запитів можуть очікувати відповіді одночасно"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, unix_path: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self._reader = None
+        self._writer = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._receiver = None
+
+    async def connect(self):
+        """Підключення до сервера і запуск задачі прийому відповідей"""
+        if self.unix_path:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.unix_path)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._receiver = asyncio.ensure_future(self._receive())
+        return self
+
+    async def close(self):
+        """Закриття з'єднання; незавершені запити отримують ConnectionError"""
+        if self._writer:
+            self._writer.close()
+            with contextlib.suppress(ConnectionError):
+                await self._writer.wait_closed()
+            self._writer = None
+        if self._receiver:
+            await self._receiver
+            self._receiver = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def call(self, operation: str, *args, **kwargs):
+        """Надсилання запиту та очікування результату"""
+        future = self.send(operation, *args, **kwargs)
+        await self._writer.drain()
+        return await future
+
+    def send(self, operation: str, *args, **kwargs) -> asyncio.Future:
+        """Надсилання запиту без очікування; повертає Future з результатом"""
+        if not self._writer:
+            raise ValueError("Client is not connected")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (operation, future)
+        self._writer.write(encode_frame({'id': request_id, 'op': operation, 'args': list(args), 'kwargs': kwargs}))
+        return future
+
+    async def pipeline(self, requests: List[tuple]) -> List[Any]:
+        """Конвеєр: усі запити (op, args, kwargs) надсилаються одразу, результати - у порядку запитів"""
+        futures = [self.send(operation, *args, **kwargs) for operation, args, kwargs in requests]
+        await self._writer.drain()
+        return await asyncio.gather(*futures)
+
+    async def _receive(self):
+        """Розподіл відповідей сервера за id запитів"""
+        try:
+            while True:
+                response = await read_frame(self._reader)
+                if response is None:
+                    break
+                pending = self._pending.pop(response.get('id'), None) if isinstance(response, dict) else None
+                if pending is None:
+                    # Відповідь без відомого id (наприклад, на некоректний кадр) нікому не належить
+                    continue
+                operation, future = pending
+                if future.done():
+                    continue
+                if response['ok']:
+                    result = response['result']
+                    if operation == 'get_rows_by_ids':
+                        # JSON перетворює ключі словника на рядки
+                        result['rows'] = {int(row_id): row for row_id, row in result['rows'].items()}
+                    future.set_result(result)
+                else:
+                    error_type = {'ValueError': ValueError, 'KeyError': KeyError}.get(response['error'], RuntimeError)
+                    future.set_exception(error_type(response['message']))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            for _, future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection to server closed"))
+            self._pending.clear()
+
+
+def main(argv=None) -> int:
+    """Запуск сервера до Ctrl+C"""
+    parser = argparse.ArgumentParser(prog='python -m server', description="Мережевий сервер запитів до бази даних")
+    parser.add_argument('database')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help="шлях Unix-сокета замість TCP")
+    parser.add_argument('--pool-size', type=int, default=4, help="кількість з'єднань для читання")
+    args = parser.parse_args(argv)
+
+    server = DatabaseServer(args.database, host=args.host, port=args.port, unix_path=args.unix,
+                            pool_size=args.pool_size)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,16 @@
 import unittest
 import os
-from database import Database, DataType
+import glob
+import threading
+import csv
+import gzip
+import json
+import asyncio
+from concurrent.futures import Future
+import cli
+import tempfile
+from database import Database, DataType, _spill_key_range, _load_spilled_keys
+from server import DatabaseServer, DatabaseClient, encode_frame, read_frame
 
 
 class TestDatabaseSystem(unittest.TestCase):
@@ -16,10 +26,15 @@ class TestDatabaseSystem(unittest.TestCase):
         if self.db.connection:
             self.db.disconnect()
         # Видалення тестових файлів
-        if os.path.exists(f"databases/{self.test_db_name}.db"):
-            os.remove(f"databases/{self.test_db_name}.db")
-        if os.path.exists("test_save.json"):
-            os.remove("test_save.json")
+        for filename in (glob.glob(f"databases/{self.test_db_name}*.db") + glob.glob("databases/restored_db*.db")
+                         + glob.glob(f"databases/{self.test_db_name}*.schema.json")
+                         + glob.glob(f"databases/{self.test_db_name}*.db-*")):
+            os.remove(filename)
+        for filename in ["test_save.json", "test_import.csv", "test_import.csv.rejects.jsonl",
+                         "test_export.csv", "test_export.jsonl.gz", "test_snapshot.tdb",
+                         "test_incremental.tdb", "test_incremental.tdb.segments", "test_batch.jsonl"]:
+            if os.path.exists(filename):
+                os.remove(filename)
 
     def test_1_create_database_and_tables(self):
         """Тест 1: Створення бази даних, таблиць з усіма типами даних"""
@@ -168,6 +183,988 @@ class TestDatabaseSystem(unittest.TestCase):
 
         print("✅ Тест 4 пройдено: Збереження/завантаження працює")
 
+    def test_5_import_file(self):
+        """Тест 5: Потоковий імпорт CSV з відхиленням некоректних рядків"""
+        fields = {
+            'name': {'type': DataType.STRING},
+            'age': {'type': DataType.INTEGER},
+            'email': {'type': DataType.EMAIL}
+        }
+        self.db.create_table('users', fields)
+
+        with open('test_import.csv', 'w', encoding='utf-8', newline='') as f:
+            f.write("full_name,age,email\n")
+            f.write("Alice,30,alice@example.com\n")
+            f.write("Bob,abc,bob@example.com\n")
+            f.write("Carol,41,carol@example.com\n")
+
+        result = self.db.import_file('users', 'test_import.csv', batch_size=2,
+                                     column_map={'full_name': 'name'})
+
+        self.assertEqual(result['inserted'], 2)
+        self.assertEqual(result['rejected'], 1)
+        self.assertTrue(os.path.exists(result['rejects_path']))
+
+        names = [row['name'] for row in self.db.get_rows('users')]
+        self.assertEqual(names, ['Alice', 'Carol'])
+
+        print("✅ Тест 5 пройдено: Імпорт з файлу працює")
+
+    def test_6_export_table(self):
+        """Тест 6: Потоковий експорт таблиці та результату перетину"""
+        self.db.define_enum('dept', ['IT', 'HR'])
+        fields = {
+            'name': {'type': DataType.STRING},
+            'department': {'type': DataType.ENUM, 'enum_name': 'dept'}
+        }
+        self.db.create_table('employees', fields)
+        self.db.create_table('projects', fields)
+        self.db.add_row('employees', {'name': 'John', 'department': 'IT'})
+        self.db.add_row('employees', {'name': 'Jane', 'department': 'HR'})
+        self.db.add_row('projects', {'name': 'Website', 'department': 'IT'})
+
+        exported = self.db.export_table('employees', 'test_export.csv', batch_size=1)
+        self.assertEqual(exported, 2)
+        with open('test_export.csv', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['name'] for row in rows], ['John', 'Jane'])
+
+        result_table = self.db.intersect_tables('employees', 'projects', ['department'])
+        self.db.export_table(result_table, 'test_export.jsonl.gz', format='jsonl', compress=True)
+        with gzip.open('test_export.jsonl.gz', 'rt', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row['department'] for row in rows], ['IT'])
+
+        print("✅ Тест 6 пройдено: Експорт таблиць працює")
+
+    def test_7_snapshot_save_and_load(self):
+        """Тест 7: Повний знімок бази даних з даними"""
+        self.db.define_enum('status', ['active', 'inactive'])
+        fields = {
+            'name': {'type': DataType.STRING},
+            'age': {'type': DataType.INTEGER},
+            'salary': {'type': DataType.REAL},
+            'status': {'type': DataType.ENUM, 'enum_name': 'status'}
+        }
+        self.db.create_table('staff', fields)
+        self.db.add_row('staff', {'name': 'Олена', 'age': '31', 'salary': '1500.5', 'status': 'active'})
+        self.db.add_row('staff', {'name': 'Bob', 'age': '007', 'salary': '2e3', 'status': 'inactive'})
+        self.db.add_row('staff', {'name': 'Eve'})
+        original_rows = self.db.get_rows('staff')
+
+        self.db.save_to_disk('test_snapshot.tdb', format='snapshot', block_size=2)
+
+        new_db = Database('restored_db')
+        try:
+            new_db.load_from_disk('test_snapshot.tdb')
+            self.assertEqual(new_db.enum_definitions['status'], ['active', 'inactive'])
+            self.assertEqual(new_db.tables[0]['fields']['age']['type'], DataType.INTEGER)
+            self.assertEqual(new_db.get_rows('staff'), original_rows)
+        finally:
+            new_db.disconnect()
+            if os.path.exists("databases/restored_db.db"):
+                os.remove("databases/restored_db.db")
+
+        print("✅ Тест 7 пройдено: Знімок бази даних працює")
+
+    def test_8_incremental_save(self):
+        """Тест 8: Інкрементальне збереження змін у сегменти та ущільнення"""
+        fields = {
+            'name': {'type': DataType.STRING},
+            'age': {'type': DataType.INTEGER}
+        }
+        self.db.create_table('users', fields)
+        first_id = self.db.add_row('users', {'name': 'Alice', 'age': '30'})
+        second_id = self.db.add_row('users', {'name': 'Bob', 'age': '40'})
+        # До першого знімка id змінених рядків не накопичуються
+        self.assertEqual(self.db._dirty_rows, {})
+
+        self.db.save_incremental('test_incremental.tdb', compact_every=3)
+        self.assertFalse(os.path.exists('test_incremental.tdb.segments'))
+
+        self.db.update_row('users', first_id, {'age': '31'})
+        self.db.delete_row('users', second_id)
+        self.db.add_row('users', {'name': 'Carol', 'age': '25'})
+        self.db.define_enum('level', ['junior', 'senior'])
+        self.db.create_table('teams', {'title': {'type': DataType.STRING}})
+        self.db.add_row('teams', {'title': 'Core'})
+        self.db.save_incremental('test_incremental.tdb', compact_every=3)
+        self.assertTrue(os.path.exists('test_incremental.tdb.segments'))
+
+        new_db = Database('restored_db')
+        try:
+            new_db.load_from_disk('test_incremental.tdb')
+            self.assertEqual(new_db.get_rows('users'), self.db.get_rows('users'))
+            self.assertEqual(new_db.get_rows('teams'), self.db.get_rows('teams'))
+            self.assertEqual(new_db.enum_definitions['level'], ['junior', 'senior'])
+        finally:
+            new_db.disconnect()
+            if os.path.exists("databases/restored_db.db"):
+                os.remove("databases/restored_db.db")
+
+        # Третє збереження досягає порогу й ущільнює сегменти у знімок
+        self.db.add_row('users', {'name': 'Dan', 'age': '50'})
+        self.db.save_incremental('test_incremental.tdb', compact_every=3)
+        self.db.add_row('users', {'name': 'Eve', 'age': '22'})
+        self.db.save_incremental('test_incremental.tdb', compact_every=3)
+        self.assertFalse(os.path.exists('test_incremental.tdb.segments'))
+
+        print("✅ Тест 8 пройдено: Інкрементальне збереження працює")
+
+    def test_9_in_memory_database_with_backup(self):
+        """Тест 9: База даних у пам'яті з онлайн-резервуванням на диск"""
+        memory_db = Database('memory_db', in_memory=True)
+        memory_db.connect()
+        self.assertFalse(os.path.exists("databases/memory_db.db"))
+
+        memory_db.create_table('events', {'title': {'type': DataType.STRING}})
+        for index in range(20):
+            memory_db.add_row('events', {'title': f'event {index}'})
+
+        progress_calls = []
+        memory_db.backup(pages=1, progress=lambda status, remaining, total: progress_calls.append(remaining))
+        memory_db.disconnect()
+        self.assertTrue(progress_calls)
+
+        reopened_db = Database('memory_db', in_memory=True)
+        try:
+            reopened_db.connect()
+            self.assertEqual(len(reopened_db.get_rows('events')), 20)
+        finally:
+            reopened_db.disconnect()
+            if os.path.exists("databases/memory_db.db"):
+                os.remove("databases/memory_db.db")
+
+        print("✅ Тест 9 пройдено: База даних у пам'яті працює")
+
+    def test_10_intersect_many(self):
+        """Тест 10: Перетин кількох таблиць за один прохід"""
+        fields = {
+            'city': {'type': DataType.STRING, 'fts': True},
+            'code': {'type': DataType.INTEGER}
+        }
+        for table_name in ['offices', 'warehouses', 'stores']:
+            self.db.create_table(table_name, fields)
+
+        for city, code in [('Kyiv', 1), ('Lviv', 2), ('Odesa', 3), ('Kyiv', 1)]:
+            self.db.add_row('offices', {'city': city, 'code': code})
+        for city, code in [('Kyiv', 1), ('Lviv', 2), ('Lviv', 5)]:
+            self.db.add_row('warehouses', {'city': city, 'code': code})
+        for city, code in [('Lviv', 2), ('Kyiv', 1)]:
+            self.db.add_row('stores', {'city': city, 'code': code})
+
+        result_table = self.db.intersect_many(['offices', 'warehouses', 'stores'], ['city', 'code'])
+
+        self.assertEqual(result_table, 'intersect_offices_warehouses_stores')
+        rows = self.db.get_rows(result_table)
+        self.assertEqual(sorted((row['city'], row['code']) for row in rows), [('Kyiv', '1'), ('Lviv', '2')])
+        # Повнотекстовий індекс джерела не переноситься в таблицю-результат
+        self.assertEqual(self.db._get_table_info(result_table)['fields']['city'], {'type': DataType.STRING})
+        with self.assertRaises(ValueError):
+            self.db.search(result_table, 'city', 'Kyiv')
+
+        print("✅ Тест 10 пройдено: Перетин кількох таблиць працює")
+
+    def test_11_set_operations(self):
+        """Тест 11: Об'єднання, різниця, напів- та антиз'єднання (SQL і хешування)"""
+        fields = {
+            'sku': {'type': DataType.STRING, 'fts': True},
+            'qty': {'type': DataType.INTEGER}
+        }
+        self.db.create_table('ledger', fields)
+        self.db.create_table('bank', fields)
+        for sku, qty in [('A', 1), ('B', 2), ('C', 3)]:
+            self.db.add_row('ledger', {'sku': sku, 'qty': qty})
+        for sku, qty in [('B', 2), ('C', 4), ('D', 5)]:
+            self.db.add_row('bank', {'sku': sku, 'qty': qty})
+
+        for strategy in ['sql', 'hash']:
+            union = self.db.union_tables('ledger', 'bank', ['sku'], strategy=strategy)
+            self.assertEqual(sorted(row['sku'] for row in union), ['A', 'B', 'C', 'D'])
+
+            difference = self.db.difference_tables('ledger', 'bank', ['sku', 'qty'], strategy=strategy)
+            self.assertEqual(sorted(row['sku'] for row in difference), ['A', 'C'])
+
+            semi = list(self.db.semi_join('ledger', 'bank', ['sku'], strategy=strategy))
+            self.assertEqual([row['sku'] for row in semi], ['B', 'C'])
+            self.assertIn('qty', semi[0])
+
+            anti = self.db.anti_join('ledger', 'bank', ['sku', 'qty'], strategy=strategy)
+            self.assertEqual([row['sku'] for row in anti], ['A', 'C'])
+
+        result_table = self.db.anti_join('ledger', [{'sku': 'A'}], ['sku'], materialize=True,
+                                         result_table_name='unmatched_ledger')
+        self.assertEqual([row['sku'] for row in self.db.get_rows(result_table)], ['B', 'C'])
+        self.assertNotIn('fts', self.db._get_table_info(result_table)['fields']['sku'])
+        difference_table = self.db.difference_tables('ledger', 'bank', ['sku'], materialize=True)
+        self.assertEqual(self.db._get_table_info(difference_table)['fields'],
+                         {'sku': {'type': DataType.STRING}})
+
+        print("✅ Тест 11 пройдено: Операції над множинами працюють")
+
+    def test_12_intersection_as_view(self):
+        """Тест 12: Перетин як VIEW бачить поточні дані й доступний лише для читання"""
+        fields = {'department': {'type': DataType.STRING}}
+        self.db.create_table('employees', fields)
+        self.db.create_table('projects', fields)
+        self.db.add_row('employees', {'department': 'IT'})
+        self.db.add_row('projects', {'department': 'IT'})
+
+        view_name = self.db.intersect_tables('employees', 'projects', ['department'], as_view=True)
+        self.assertTrue(self.db._get_table_info(view_name)['virtual'])
+        self.assertEqual([row['department'] for row in self.db.get_rows(view_name)], ['IT'])
+
+        self.db.add_row('employees', {'department': 'HR'})
+        self.db.add_row('projects', {'department': 'HR'})
+        self.assertEqual(sorted(row['department'] for row in self.db.get_rows(view_name)), ['HR', 'IT'])
+
+        with self.assertRaises(ValueError):
+            self.db.add_row(view_name, {'department': 'Finance'})
+
+        self.db.save_to_disk('test_snapshot.tdb', format='snapshot')
+        new_db = Database('restored_db')
+        try:
+            new_db.load_from_disk('test_snapshot.tdb')
+            self.assertEqual(len(new_db.get_rows(view_name)), 2)
+        finally:
+            new_db.disconnect()
+            if os.path.exists("databases/restored_db.db"):
+                os.remove("databases/restored_db.db")
+
+        print("✅ Тест 12 пройдено: Перетин як представлення працює")
+
+    def test_13_maintained_intersection(self):
+        """Тест 13: Перетин, що підтримується інкрементально при змінах вихідних таблиць"""
+        fields = {'department': {'type': DataType.STRING}}
+        self.db.create_table('employees', fields)
+        self.db.create_table('projects', fields)
+        john_id = self.db.add_row('employees', {'department': 'IT'})
+        self.db.add_row('employees', {'department': 'IT'})
+        self.db.add_row('projects', {'department': 'IT'})
+        hr_project_id = self.db.add_row('projects', {'department': 'HR'})
+
+        result_table = self.db.intersect_tables('employees', 'projects', ['department'], maintained=True)
+
+        def departments():
+            return sorted(row['department'] for row in self.db.get_rows(result_table))
+
+        self.assertEqual(departments(), ['IT'])
+
+        # Видалення ключа тригером користується індексом результату, а не скануванням
+        plan = self.db.connection.execute(f"EXPLAIN QUERY PLAN DELETE FROM {result_table} "
+                                          f"WHERE department IS ?", ('IT',)).fetchall()
+        self.assertIn(f"{result_table}__keys", ' '.join(row[-1] for row in plan))
+
+        jane_id = self.db.add_row('employees', {'department': 'HR'})
+        self.assertEqual(departments(), ['HR', 'IT'])
+
+        # Ключ IT лишається, доки на нього посилається хоча б один рядок
+        self.db.delete_row('employees', john_id)
+        self.assertEqual(departments(), ['HR', 'IT'])
+
+        self.db.update_row('employees', jane_id, {'department': 'Finance'})
+        self.assertEqual(departments(), ['IT'])
+
+        self.db.update_row('projects', hr_project_id, {'department': 'Finance'})
+        self.assertEqual(departments(), ['Finance', 'IT'])
+
+        with self.assertRaises(ValueError):
+            self.db.add_row(result_table, {'department': 'Sales'})
+
+        self.db.save_to_disk('test_snapshot.tdb', format='snapshot')
+        new_db = Database('restored_db')
+        try:
+            new_db.load_from_disk('test_snapshot.tdb')
+            new_db.add_row('projects', {'department': 'HR'})
+            new_db.add_row('employees', {'department': 'HR'})
+            self.assertEqual(sorted(row['department'] for row in new_db.get_rows(result_table)),
+                             ['Finance', 'HR', 'IT'])
+        finally:
+            new_db.disconnect()
+            if os.path.exists("databases/restored_db.db"):
+                os.remove("databases/restored_db.db")
+
+        print("✅ Тест 13 пройдено: Підтримуваний перетин працює")
+
+    def test_14_parallel_intersection(self):
+        """Тест 14: Паралельний перетин з розподілом за розділами"""
+        fields = {
+            'city': {'type': DataType.STRING},
+            'code': {'type': DataType.INTEGER}
+        }
+        self.db.create_table('offices', fields)
+        self.db.create_table('stores', fields)
+        self.db._bulk_insert('offices', ['city', 'code'], [(f'city{index % 50}', index % 7) for index in range(300)])
+        self.db._bulk_insert('stores', ['city', 'code'], [(f'city{index % 30}', index % 7) for index in range(200)])
+
+        expected = {(row['city'], row['code'])
+                    for row in self.db.set_operation('intersect', 'offices', 'stores', ['city', 'code'])}
+
+        result_table = self.db.intersect_tables('offices', 'stores', ['city', 'code'], workers=2)
+        rows = self.db.get_rows(result_table)
+        self.assertEqual(len(rows), len(expected))
+        self.assertEqual({(row['city'], row['code']) for row in rows}, expected)
+
+        # Кожен процес читає лише свій діапазон id, а розділи разом містять кожен рядок рівно один раз
+        with tempfile.TemporaryDirectory() as spill_dir:
+            db_path = os.path.abspath(self.db.file_path)
+            self.assertEqual(_spill_key_range(db_path, 'offices', ['city', 'code'], 1, 100, 4, spill_dir, 'low'), 100)
+            self.assertEqual(_spill_key_range(db_path, 'offices', ['city', 'code'], 101, 300, 4, spill_dir, 'high'), 200)
+            low = [key for partition in range(4) for key in _load_spilled_keys(spill_dir, 'low', partition)]
+            high = [key for partition in range(4) for key in _load_spilled_keys(spill_dir, 'high', partition)]
+            self.assertEqual(sorted(low), sorted((f'city{index % 50}', str(index % 7)) for index in range(100)))
+            self.assertEqual(len(high), 200)
+
+        print("✅ Тест 14 пройдено: Паралельний перетин працює")
+
+    def test_15_intersection_with_memory_limit(self):
+        """Тест 15: Операції з лімітом пам'яті через розділи на диску"""
+        fields = {'code': {'type': DataType.INTEGER}}
+        self.db.create_table('left_codes', fields)
+        self.db.create_table('right_codes', fields)
+        self.db._bulk_insert('left_codes', ['code'], [(index,) for index in range(0, 600, 2)])
+        self.db._bulk_insert('right_codes', ['code'], [(index,) for index in range(0, 600, 3)])
+
+        result_table = self.db.intersect_tables('left_codes', 'right_codes', ['code'], memory_limit=2000)
+        codes = sorted(int(row['code']) for row in self.db.get_rows(result_table))
+        self.assertEqual(codes, list(range(0, 600, 6)))
+
+        for operation in ['union', 'difference', 'semi_join', 'anti_join']:
+            expected = list(self.db.set_operation(operation, 'left_codes', 'right_codes', ['code'], strategy='sql'))
+            limited = list(self.db.set_operation(operation, 'left_codes', 'right_codes', ['code'],
+                                                 strategy='hash', memory_limit=2000))
+            self.assertEqual(sorted(row['code'] for row in limited), sorted(row['code'] for row in expected))
+
+        # Мала сторона побудови вміщується у ліміт, а видані ключі різниці - ні
+        self.db.create_table('few_codes', fields)
+        self.db._bulk_insert('few_codes', ['code'], [(index,) for index in range(0, 600, 100)])
+        for operation in ['difference', 'intersect']:
+            expected = list(self.db.set_operation(operation, 'left_codes', 'few_codes', ['code'], strategy='sql'))
+            limited = list(self.db._hash_set_operation(operation, 'left_codes', 'few_codes', ['code'],
+                                                       batch_size=50, memory_limit=2000))
+            self.assertEqual(sorted(row['code'] for row in limited), sorted(row['code'] for row in expected))
+            self.assertEqual(len(limited), len(set(row['code'] for row in limited)))
+
+        print("✅ Тест 15 пройдено: Перетин з лімітом пам'яті працює")
+
+    def test_16_sharded_table(self):
+        """Тест 16: Шардована таблиця з маршрутизацією за ключем і паралельним читанням"""
+        fields = {
+            'city': {'type': DataType.STRING},
+            'amount': {'type': DataType.INTEGER}
+        }
+        self.db.create_table('sales', fields, shards=3, shard_key='city')
+        for shard in range(3):
+            self.assertTrue(os.path.exists(f"databases/{self.test_db_name}_shard{shard}.db"))
+
+        row_ids = [self.db.add_row('sales', {'city': city, 'amount': amount})
+                   for city, amount in [('Kyiv', 10), ('Lviv', 20), ('Odesa', 30), ('Kyiv', 40)]]
+        self.db._bulk_insert('sales', ['city', 'amount'], [('Dnipro', 50), ('Lviv', 60)])
+        self.assertEqual(len(set(row_ids)), 4)
+
+        rows = self.db.get_rows('sales')
+        self.assertEqual(len(rows), 6)
+        self.assertEqual([row['id'] for row in rows], sorted(row['id'] for row in rows))
+
+        self.assertEqual(self.db.get_row_by_id('sales', row_ids[1])['city'], 'Lviv')
+        self.assertTrue(self.db.update_row('sales', row_ids[1], {'amount': 25}))
+        self.assertTrue(self.db.delete_row('sales', row_ids[0]))
+
+        self.assertEqual(self.db.aggregate('sales', 'count'), 5)
+        self.assertEqual(self.db.aggregate('sales', 'sum', 'amount'), 205)
+        self.assertEqual(self.db.aggregate('sales', 'avg', 'amount'), 41)
+
+        # Операції читання через SQL бачать усі шарди разом
+        self.db.create_table('targets', {'city': {'type': DataType.STRING}})
+        self.db.add_row('targets', {'city': 'Lviv'})
+        self.assertEqual(len(list(self.db.semi_join('sales', 'targets', ['city']))), 2)
+
+        self.db.save_to_disk('test_snapshot.tdb', format='snapshot')
+        new_db = Database('restored_db')
+        try:
+            new_db.load_from_disk('test_snapshot.tdb')
+            self.assertEqual(new_db.get_rows('sales'), self.db.get_rows('sales'))
+            new_id = new_db.add_row('sales', {'city': 'Kyiv', 'amount': 1})
+            self.assertNotIn(new_id, [row['id'] for row in rows])
+        finally:
+            new_db.disconnect()
+
+        print("✅ Тест 16 пройдено: Шардовані таблиці працюють")
+
+    def test_17_writer_group_commit(self):
+        """Тест 17: Потік-записувач з груповою фіксацією для кількох виробників"""
+        fields = {
+            'name': {'type': DataType.STRING},
+            'email': {'type': DataType.EMAIL}
+        }
+        self.db.create_table('users', fields)
+        self.db.start_writer(batch_size=16, flush_interval=0.01)
+
+        futures = []
+
+        def produce(producer):
+            for index in range(10):
+                futures.append(self.db.submit('add_row', 'users',
+                                              {'name': f'user {producer}-{index}', 'email': f'u{index}@example.com'}))
+
+        producers = [threading.Thread(target=produce, args=(producer,)) for producer in range(4)]
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+        invalid = self.db.submit('add_row', 'users', {'name': 'broken', 'email': 'not-an-email'})
+
+        row_ids = [future.result(timeout=5) for future in futures]
+        with self.assertRaises(ValueError):
+            invalid.result(timeout=5)
+
+        update = self.db.submit('update_row', 'users', row_ids[0], {'name': 'renamed'})
+        self.assertTrue(update.result(timeout=5))
+
+        # Прямий запис з іншого потоку зруйнував би точки збереження групи
+        with self.assertRaises(ValueError):
+            self.db.add_row('users', {'name': 'direct', 'email': 'd@example.com'})
+
+        # Збій самої групи (тут - фіксація всередині операції) завершує всі її Future, а не лише виконані
+        self.db._writer_queue.put((Future(), self.db.connection.commit, (), {}))
+        pending = self.db.submit('add_row', 'users', {'name': 'after', 'email': 'a@example.com'})
+        self.assertIsNotNone(pending.exception(timeout=5))
+        self.db.stop_writer()
+
+        self.assertEqual(len(set(row_ids)), 40)
+        rows = self.db.get_rows('users')
+        self.assertEqual(len(rows), 40)
+        self.assertEqual(self.db.get_row_by_id('users', row_ids[0])['name'], 'renamed')
+
+        print("✅ Тест 17 пройдено: Групова фіксація працює")
+
+    def test_18_enum_dictionary_encoding(self):
+        """Тест 18: Переліки зберігаються цілими кодами, а читаються значеннями"""
+        self.db.define_enum('department', ['IT', 'HR', 'Finance'])
+        fields = {
+            'name': {'type': DataType.STRING},
+            'department': {'type': DataType.ENUM, 'enum_name': 'department'}
+        }
+        self.db.create_table('staff', fields)
+        self.db.create_table('projects', {'department': {'type': DataType.ENUM, 'enum_name': 'department'}})
+        row_id = self.db.add_row('staff', {'name': 'Ann', 'department': 'HR'})
+        self.db.add_row('staff', {'name': 'Bob', 'department': 'IT'})
+        self.db.add_row('projects', {'department': 'HR'})
+
+        cursor = self.db.connection.cursor()
+        cursor.execute("SELECT department FROM staff WHERE id = ?", (row_id,))
+        self.assertIsInstance(cursor.fetchone()[0], int)
+        self.assertEqual(self.db.get_row_by_id('staff', row_id)['department'], 'HR')
+
+        # Нові значення отримують нові коди, старі коди не змінюються
+        self.db.define_enum('department', ['IT', 'HR', 'Finance', 'Legal'])
+        self.db.update_row('staff', row_id, {'department': 'Legal'})
+        self.assertEqual(self.db.get_row_by_id('staff', row_id)['department'], 'Legal')
+        self.db.update_row('staff', row_id, {'department': 'HR'})
+
+        # Порожнє значення зберігається окремим кодом, невідоме значення без перевірки - ValueError
+        empty_id = self.db.add_row('staff', {'name': 'Eve', 'department': ''})
+        self.assertEqual(self.db.get_row_by_id('staff', empty_id)['department'], '')
+        self.db.delete_row('staff', empty_id)
+        with self.assertRaises(ValueError):
+            self.db.apply_changes([{'seq': 1, 'table': 'staff', 'operation': 'insert', 'row_id': 99,
+                                    'data': {'id': 99, 'name': 'Max', 'department': 'Sales'}}])
+        self.assertIsNone(self.db.get_row_by_id('staff', 99))
+
+        result_table = self.db.intersect_tables('staff', 'projects', ['department'])
+        self.assertEqual([row['department'] for row in self.db.get_rows(result_table)], ['HR'])
+
+        # Текстове поле порівнюється з кодованим через хеш-стратегію
+        self.db.create_table('labels', {'department': {'type': DataType.STRING}})
+        self.db.add_row('labels', {'department': 'IT'})
+        self.assertEqual([row['department'] for row in self.db.semi_join('staff', 'labels', ['department'])], ['IT'])
+        with self.assertRaises(ValueError):
+            self.db.set_operation('intersect', 'staff', 'labels', ['department'], strategy='sql')
+
+        self.db.save_to_disk('test_snapshot.tdb', format='snapshot')
+        new_db = Database('restored_db')
+        try:
+            new_db.load_from_disk('test_snapshot.tdb')
+            self.assertEqual(new_db.get_rows('staff'), self.db.get_rows('staff'))
+        finally:
+            new_db.disconnect()
+
+        print("✅ Тест 18 пройдено: Кодування переліків працює")
+
+    def test_19_full_text_search(self):
+        """Тест 19: Повнотекстовий пошук по індексованих полях STRING та EMAIL"""
+        fields = {
+            'title': {'type': DataType.STRING, 'fts': True},
+            'email': {'type': DataType.EMAIL, 'fts': 'trigram'},
+            'age': {'type': DataType.INTEGER}
+        }
+        self.db.create_table('articles', fields)
+        first_id = self.db.add_row('articles', {'title': 'Fast database indexes', 'email': 'ann@example.com', 'age': 30})
+        second_id = self.db.add_row('articles', {'title': 'Slow queries explained', 'email': 'bob@test.org', 'age': 40})
+        self.db._bulk_insert('articles', ['title', 'email', 'age'], [('Database tuning guide', 'eve@example.com', 50)])
+
+        self.assertEqual(len(self.db.search('articles', 'title', 'database')), 2)
+        self.assertEqual(len(self.db.search('articles', 'email', 'example', limit=1)), 1)
+        self.assertEqual({row['id'] for row in self.db.search('articles', 'email', 'test.o')}, {second_id})
+
+        # Індекс стежить за змінами та видаленнями рядків
+        self.db.update_row('articles', first_id, {'title': 'Fast caches'})
+        self.assertEqual(len(self.db.search('articles', 'title', 'database')), 1)
+        self.db.delete_row('articles', second_id)
+        self.assertEqual(self.db.search('articles', 'title', 'queries'), [])
+
+        with self.assertRaises(ValueError):
+            self.db.search('articles', 'age', 'x')
+        with self.assertRaises(ValueError):
+            self.db.create_table('bad', {'age': {'type': DataType.INTEGER, 'fts': True}})
+
+        self.db.save_to_disk('test_snapshot.tdb', format='snapshot')
+        new_db = Database('restored_db')
+        try:
+            new_db.load_from_disk('test_snapshot.tdb')
+            self.assertEqual(len(new_db.search('articles', 'title', 'database')), 1)
+        finally:
+            new_db.disconnect()
+
+        print("✅ Тест 19 пройдено: Повнотекстовий пошук працює")
+
+    def test_20_performance_profiles(self):
+        """Тест 20: Профілі продуктивності та їх перемикання під час роботи"""
+        self.assertEqual(self.db.profile, 'durable')
+        self.assertEqual(self.db.get_pragmas()['synchronous'], 2)
+
+        self.db.create_table('users', {'name': {'type': DataType.STRING}})
+        previous = self.db.set_profile('bulk_load')
+        self.assertEqual(previous, 'durable')
+        pragmas = self.db.get_pragmas()
+        self.assertEqual(pragmas['journal_mode'], 'memory')
+        self.assertEqual(pragmas['synchronous'], 0)
+        self.db._bulk_insert('users', ['name'], [(f"user{index}",) for index in range(1000)])
+
+        self.db.set_profile('balanced')
+        self.assertEqual(self.db.get_pragmas()['journal_mode'], 'wal')
+        self.assertEqual(len(self.db.get_rows('users')), 1000)
+        self.db.set_profile(previous)
+        self.assertEqual(self.db.get_pragmas()['journal_mode'], 'delete')
+
+        with self.assertRaises(ValueError):
+            self.db.set_profile('reckless')
+
+        print("✅ Тест 20 пройдено: Профілі продуктивності працюють")
+
+    def test_21_batch_update_and_delete(self):
+        """Тест 21: Пакетне оновлення та видалення за умовою і списком id"""
+        self.db.define_enum('status', ['active', 'inactive'])
+        fields = {
+            'name': {'type': DataType.STRING},
+            'age': {'type': DataType.INTEGER},
+            'status': {'type': DataType.ENUM, 'enum_name': 'status'}
+        }
+        self.db.create_table('users', fields)
+        self.db._bulk_insert('users', ['name', 'age', 'status'],
+                             [(f"user{index}", index, 'active') for index in range(1, 1201)])
+
+        self.assertEqual(self.db.update_rows('users', {'status': 'inactive'}, ids=range(1, 601)), 600)
+        self.assertEqual(self.db.update_rows('users', {'age': 0}, where={'status': 'inactive', 'name': ['user1', 'user2']}), 2)
+        self.assertEqual(self.db.get_row_by_id('users', 1)['age'], '0')
+        self.assertEqual(self.db.get_row_by_id('users', 700)['status'], 'active')
+
+        with self.assertRaises(ValueError):
+            self.db.update_rows('users', {'age': 'abc'}, ids=[1])
+        with self.assertRaises(ValueError):
+            self.db.delete_rows('users', where={'status': 'unknown'})
+        with self.assertRaises(ValueError):
+            self.db.delete_rows('users')
+
+        self.assertEqual(self.db.delete_rows('users', where={'status': 'inactive'}), 600)
+        self.assertEqual(self.db.delete_rows('users', ids=[601, 602, 5000]), 2)
+        self.assertEqual(len(self.db.get_rows('users')), 598)
+
+        # Після знімка змінені id відстежуються для сегмента інкрементального збереження
+        self.db.save_incremental('test_incremental.tdb')
+        self.assertEqual(self.db.update_rows('users', {'age': 1}, ids=[700, 701]), 2)
+        self.assertEqual(self.db._dirty_rows['users'], {700, 701})
+        # Пакетна вставка позначає лише вставлені рядки, а не всю таблицю
+        self.db._bulk_insert('users', ['name', 'age', 'status'], [('late', 2, 'active')])
+        self.db._bulk_insert('users', ['id', 'name', 'age', 'status'], [(5, 'back', 3, 'active')])
+        self.assertEqual(self.db._dirty_rows['users'], {700, 701, 1201, 5})
+        self.assertNotIn('users', self.db._dirty_tables)
+        self.db.save_incremental('test_incremental.tdb')
+        new_db = Database('restored_db')
+        try:
+            new_db.load_from_disk('test_incremental.tdb')
+            self.assertEqual(new_db.get_row_by_id('users', 701)['age'], '1')
+            self.assertEqual(new_db.get_rows('users'), self.db.get_rows('users'))
+        finally:
+            new_db.disconnect()
+
+        print("✅ Тест 21 пройдено: Пакетні оновлення та видалення працюють")
+
+    def test_22_get_rows_by_ids(self):
+        """Тест 22: Пакетне отримання рядків за id зі звітом про відсутні"""
+        self.db.create_table('users', {'name': {'type': DataType.STRING}})
+        self.db._bulk_insert('users', ['name'], [(f"user{index}",) for index in range(1, 1101)])
+        self.db.delete_row('users', 10)
+
+        result = self.db.get_rows_by_ids('users', [5, 10, 1100, 1050, 5, 2000] + list(range(100, 700)))
+        self.assertEqual(len(result['rows']), 603)
+        self.assertEqual(result['rows'][1050]['name'], 'user1050')
+        self.assertEqual(result['missing'], [10, 2000])
+        self.assertEqual(self.db.get_rows_by_ids('users', []), {'rows': {}, 'missing': []})
+
+        print("✅ Тест 22 пройдено: Пакетне отримання за id працює")
+
+    def test_23_table_maintenance(self):
+        """Тест 23: Видалення й очищення таблиць та обслуговування файлу бази"""
+        # У базі лише з шардованими таблицями ще немає sqlite_sequence
+        self.db.create_table('events', {'kind': {'type': DataType.STRING}}, shards=2)
+        self.db.add_row('events', {'kind': 'click'})
+        self.assertEqual(self.db.truncate_table('events'), 1)
+        self.assertTrue(self.db.delete_table('events'))
+
+        self.db.create_table('logs', {'message': {'type': DataType.STRING}})
+        self.db.create_table('users', {'name': {'type': DataType.STRING}})
+        self.db.create_table('admins', {'name': {'type': DataType.STRING}})
+        self.db._bulk_insert('logs', ['message'], [("x" * 200,) for _ in range(3000)])
+        self.db.add_row('users', {'name': 'Ann'})
+        self.db.save_incremental('test_incremental.tdb')
+
+        view_name = self.db.intersect_tables('users', 'admins', ['name'], as_view=True)
+        with self.assertRaises(ValueError):
+            self.db.delete_table('users')
+        self.assertTrue(self.db.delete_table(view_name))
+
+        self.assertEqual(self.db.truncate_table('logs'), 3000)
+        self.assertEqual(self.db.add_row('logs', {'message': 'again'}), 1)
+        self.assertTrue(self.db.delete_table('admins'))
+        self.assertNotIn('admins', [table['name'] for table in self.db.tables])
+
+        sizes = self.db.vacuum()
+        self.assertLess(sizes['after'], sizes['before'])
+        self.assertIn('after', self.db.incremental_vacuum())
+        self.db.analyze('users')
+        self.db.optimize()
+
+        # Видалення таблиці потрапляє в сегмент інкрементального збереження
+        self.db.save_incremental('test_incremental.tdb')
+        new_db = Database('restored_db')
+        try:
+            new_db.load_from_disk('test_incremental.tdb')
+            self.assertEqual(sorted(table['name'] for table in new_db.tables), ['logs', 'users'])
+            self.assertEqual(len(new_db.get_rows('logs')), 1)
+        finally:
+            new_db.disconnect()
+
+        self.db.start_maintenance(interval=0.01, idle_after=0, tasks=['optimize'])
+        self.db.stop_maintenance()
+
+        print("✅ Тест 23 пройдено: Обслуговування таблиць працює")
+
+    def test_24_table_statistics(self):
+        """Тест 24: Каталог статистики з оцінками HyperLogLog та інкрементальним оновленням"""
+        self.db.define_enum('status', ['active', 'inactive'])
+        fields = {
+            'city': {'type': DataType.STRING},
+            'code': {'type': DataType.INTEGER},
+            'status': {'type': DataType.ENUM, 'enum_name': 'status'}
+        }
+        self.db.create_table('events', fields)
+        self.db._bulk_insert('events', ['city', 'code', 'status'],
+                             [(f"city{index % 50}", index, 'active') for index in range(5000)])
+
+        stats = self.db.table_stats('events')
+        self.assertEqual(stats['row_count'], 5000)
+        self.assertAlmostEqual(stats['distinct']['city'], 50, delta=2)
+        self.assertAlmostEqual(stats['distinct']['code'], 5000, delta=250)
+        self.assertEqual(stats['distinct']['status'], 1)
+
+        # Записи оновлюють каталог без повторного сканування
+        self.db.add_row('events', {'city': 'Kyiv', 'code': 1, 'status': 'inactive'})
+        self.db._bulk_insert('events', ['city', 'code', 'status'], [('Lviv', 2, 'active')])
+        self.db.delete_rows('events', where={'city': 'city0'})
+        stats = self.db.table_stats('events')
+        self.assertEqual(stats['row_count'], 4902)
+        self.assertAlmostEqual(stats['distinct']['city'], 52, delta=2)
+        self.assertEqual(stats['distinct']['status'], 2)
+        self.assertAlmostEqual(self.db.table_stats('events', refresh=True)['distinct']['city'], 51, delta=2)
+
+        # Перетин будує хеш-таблицю на меншій стороні, результат не залежить від порядку
+        self.db.create_table('cities', {'city': {'type': DataType.STRING}})
+        self.db.add_row('cities', {'city': 'Kyiv'})
+        self.db.add_row('cities', {'city': 'Odesa'})
+        rows = self.db.set_operation('intersect', 'events', 'cities', ['city'], strategy='hash')
+        self.assertEqual([row['city'] for row in rows], ['Kyiv'])
+        # Планування на холодному каталозі обходиться кількістю рядків, без побудови скетчів
+        self.assertEqual(self.db._stats['cities']['sketches'], {})
+
+        print("✅ Тест 24 пройдено: Статистика таблиць працює")
+
+    def test_25_change_log_replication(self):
+        """Тест 25: Журнал змін і репліка, що синхронізується лише змінами"""
+        self.db.enable_change_log()
+        self.db.define_enum('status', ['active', 'inactive'])
+        fields = {
+            'name': {'type': DataType.STRING, 'fts': True},
+            'status': {'type': DataType.ENUM, 'enum_name': 'status'}
+        }
+        self.db.create_table('users', fields)
+        first_id = self.db.add_row('users', {'name': 'Ann', 'status': 'active'})
+        second_id = self.db.add_row('users', {'name': 'Bob', 'status': 'active'})
+        self.db.update_row('users', first_id, {'status': 'inactive'})
+
+        replica = Database('restored_db')
+        replica.connect()
+        try:
+            position = replica.apply_changes(self.db.changes_since(0))
+            self.assertEqual(position, self.db.last_change_seq())
+            self.assertEqual(replica.get_rows('users'), self.db.get_rows('users'))
+
+            # Повторна синхронізація передає лише нові зміни
+            self.db.delete_row('users', second_id)
+            self.db._bulk_insert('users', ['name', 'status'], [('Eve', 'active'), ('Max', 'inactive')])
+            new_changes = list(self.db.changes_since(position))
+            self.assertEqual([change['operation'] for change in new_changes], ['delete', 'insert', 'insert'])
+            self.assertEqual(new_changes[1]['data']['status'], 'active')
+
+            position = replica.apply_changes(new_changes)
+            self.assertEqual(replica.get_rows('users'), self.db.get_rows('users'))
+            self.assertEqual(len(replica.search('users', 'name', 'Eve')), 1)
+
+            self.assertEqual(self.db.prune_changes(position), 8)
+            self.assertEqual(list(self.db.changes_since(0)), [])
+            self.assertEqual(self.db.last_change_seq(), position)
+        finally:
+            replica.disconnect()
+
+        print("✅ Тест 25 пройдено: Журнал змін і реплікація працюють")
+
+    def test_26_parallel_validation_import(self):
+        """Тест 26: Імпорт через конвеєр з паралельною валідацією у пулі процесів"""
+        self.db.define_enum('status', ['active', 'inactive'])
+        fields = {
+            'name': {'type': DataType.STRING},
+            'age': {'type': DataType.INTEGER},
+            'email': {'type': DataType.EMAIL},
+            'status': {'type': DataType.ENUM, 'enum_name': 'status'}
+        }
+        self.db.create_table('users', fields)
+
+        with open('test_import.csv', 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'age', 'email', 'status'])
+            for index in range(1000):
+                if index % 100 == 0:
+                    writer.writerow([f"user{index}", 'abc', f"user{index}@example.com", 'active'])
+                elif index % 100 == 1:
+                    writer.writerow([f"user{index}", index, 'broken-email', 'active'])
+                else:
+                    writer.writerow([f"user{index}", index, f"user{index}@example.com",
+                                     'active' if index % 2 else 'inactive'])
+
+        result = self.db.import_file('users', 'test_import.csv', batch_size=64, workers=2, queue_size=2)
+        self.assertEqual(result['inserted'], 980)
+        self.assertEqual(result['rejected'], 20)
+
+        # Порядок рядків і відхилень збігається з файлом
+        names = [row['name'] for row in self.db.get_rows('users')]
+        self.assertEqual(names[:3], ['user2', 'user3', 'user4'])
+        with open(result['rejects_path'], encoding='utf-8') as f:
+            rejected_lines = [json.loads(line)['line'] for line in f]
+        self.assertEqual(rejected_lines[:4], [2, 3, 102, 103])
+
+        print("✅ Тест 26 пройдено: Конвеєр паралельної валідації працює")
+
+    def test_27_headless_cli(self):
+        """Тест 27: Консольні команди та пакетний режим однією транзакцією"""
+        db_name = f"{self.test_db_name}_cli"
+        self.assertEqual(cli.main(['enum', db_name, 'status', 'active', 'inactive']), 0)
+        self.assertEqual(cli.main(['create', db_name, 'users', 'name:string', 'status:enum:status']), 0)
+
+        with open('test_batch.jsonl', 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'op': 'add_row', 'args': ['users', {'name': 'Ann', 'status': 'active'}]}) + '\n')
+            f.write(json.dumps({'op': 'add_row', 'args': ['users', {'name': 'Bob', 'status': 'inactive'}]}) + '\n')
+        self.assertEqual(cli.main(['batch', db_name, 'test_batch.jsonl']), 0)
+
+        # Поля create_table перетворюються на типи і в позиційних, і в іменованих аргументах
+        with open('test_batch.jsonl', 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'op': 'create_table', 'args': ['teams', {'size': {'type': 'integer'}}]}) + '\n')
+            f.write(json.dumps({'op': 'create_table', 'kwargs': {'table_name': 'tags',
+                                                                 'fields': {'label': {'type': 'string'}}}}) + '\n')
+            f.write(json.dumps({'op': 'add_row', 'args': ['teams', {'size': 5}]}) + '\n')
+        self.assertEqual(cli.main(['batch', db_name, 'test_batch.jsonl']), 0)
+        self.assertEqual(cli.main(['export', db_name, 'teams', 'test_export.csv']), 0)
+        with open('test_export.csv', encoding='utf-8') as f:
+            self.assertEqual([row['size'] for row in csv.DictReader(f)], ['5'])
+        # Поле нової таблиці перевіряється за типом уже в тому самому пакеті
+        with open('test_batch.jsonl', 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'op': 'create_table', 'args': ['groups', {'size': {'type': 'integer'}}]}) + '\n')
+            f.write(json.dumps({'op': 'add_row', 'args': ['groups', {'size': 'five'}]}) + '\n')
+        self.assertEqual(cli.main(['batch', db_name, 'test_batch.jsonl']), 1)
+
+        # Помилка в будь-якій операції відкочує весь пакет
+        with open('test_batch.jsonl', 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'op': 'add_row', 'args': ['users', {'name': 'Eve', 'status': 'active'}]}) + '\n')
+            f.write(json.dumps({'op': 'add_row', 'args': ['users', {'name': 'Max', 'status': 'unknown'}]}) + '\n')
+        self.assertEqual(cli.main(['batch', db_name, 'test_batch.jsonl']), 1)
+
+        self.assertEqual(cli.main(['export', db_name, 'users', 'test_export.csv']), 0)
+        with open('test_export.csv', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([(row['name'], row['status']) for row in rows], [('Ann', 'active'), ('Bob', 'inactive')])
+        self.assertEqual(cli.main(['stats', db_name, 'users']), 0)
+        self.assertEqual(cli.main(['vacuum', db_name, '--analyze']), 0)
+
+        print("✅ Тест 27 пройдено: Консольний інтерфейс працює")
+
+    def test_28_query_server(self):
+        """Тест 28: Мережевий сервер з пулом з'єднань і конвеєризацією запитів клієнта"""
+        db_name = f"{self.test_db_name}_server"
+
+        async def scenario():
+            server = DatabaseServer(db_name, port=0, pool_size=2)
+            await server.start()
+            try:
+                async with DatabaseClient(port=server.port) as client:
+                    await client.call('define_enum', 'status', ['active', 'inactive'])
+                    await client.call('create_table', 'users', {'name': {'type': DataType.STRING},
+                                                                'status': {'type': DataType.ENUM,
+                                                                           'enum_name': 'status'}})
+
+                    # Записи, надіслані конвеєром, фіксуються групою
+                    ids = await client.pipeline([('add_row', ['users', {'name': f"user{i}", 'status': 'active'}], {})
+                                                 for i in range(20)])
+                    self.assertEqual(len(set(ids)), 20)
+                    self.assertEqual(await client.call('add_rows', 'users', [{'name': 'Ann', 'status': 'inactive'},
+                                                                             {'name': 'Bob', 'status': 'inactive'}]), 2)
+
+                    rows, by_ids, count, stats = await client.pipeline([
+                        ('get_rows', ['users'], {}),
+                        ('get_rows_by_ids', ['users', [ids[0], 999]], {}),
+                        ('aggregate', ['users', 'count'], {}),
+                        ('table_stats', ['users'], {}),
+                    ])
+                    self.assertEqual(len(rows), 22)
+                    self.assertEqual(by_ids['rows'][ids[0]]['name'], 'user0')
+                    self.assertEqual(by_ids['missing'], [999])
+                    self.assertEqual(count, 22)
+                    self.assertEqual(stats['row_count'], 22)
+
+                    self.assertEqual(await client.call('delete_rows', 'users', where={'status': 'inactive'}), 2)
+                    self.assertEqual(len(await client.call('get_rows', 'users')), 20)
+
+                    # Помилка повертається клієнту і не обриває з'єднання
+                    with self.assertRaises(ValueError):
+                        await client.call('add_row', 'users', {'name': 'Eve', 'status': 'unknown'})
+                    with self.assertRaises(ValueError):
+                        await client.call('disconnect')
+                    self.assertEqual(await client.call('aggregate', 'users', 'count'), 20)
+
+                    # Кадр, що не є JSON-об'єктом, отримує відповідь з помилкою без id
+                    raw_reader, raw_writer = await asyncio.open_connection('127.0.0.1', server.port)
+                    raw_writer.write(encode_frame([1, 2]))
+                    response = await asyncio.wait_for(read_frame(raw_reader), timeout=5)
+                    self.assertEqual((response['id'], response['ok']), (None, False))
+                    raw_writer.close()
+
+                    # Клієнт пропускає відповіді з невідомим id і продовжує працювати
+                    client._reader.feed_data(encode_frame({'id': None, 'ok': False, 'error': 'ValueError',
+                                                           'message': 'orphan'}))
+                    self.assertEqual(await client.call('aggregate', 'users', 'count'), 20)
+
+                    # Читання в конвеєрі бачить записи, надіслані раніше тим самим з'єднанням
+                    for attempt in range(5):
+                        new_id, rows_after, count_after = await client.pipeline([
+                            ('add_row', ['users', {'name': f"late{attempt}", 'status': 'active'}], {}),
+                            ('get_rows', ['users'], {}),
+                            ('aggregate', ['users', 'count'], {}),
+                        ])
+                        self.assertIn(new_id, [row['id'] for row in rows_after])
+                        self.assertEqual(count_after, 21 + attempt)
+
+                    # Зміна схеми після запуску видна читачам пулу
+                    await client.call('create_table', 'tags', {'label': {'type': DataType.STRING}})
+                    await client.call('add_row', 'tags', {'label': 'new'})
+                    self.assertEqual([row['label'] for row in await client.call('get_rows', 'tags')], ['new'])
+            finally:
+                await server.stop()
+
+        asyncio.run(scenario())
+
+        print("✅ Тест 28 пройдено: Мережевий сервер обслуговує конвеєр запитів")
+
+
+    def test_29_batch_rolls_back_schema_changes(self):
+        """Тест 29: Невдалий пакет відкочує і створення таблиці на його початку"""
+        with self.assertRaises(ValueError):
+            self.db.execute_batch([
+                {'op': 'create_table', 'args': ['batch_items', {'name': {'type': DataType.STRING}}]},
+                {'op': 'add_row', 'args': ['batch_items', {'name': 'first'}]},
+                {'op': 'add_row', 'args': ['missing_table', {'name': 'second'}]},
+            ])
+
+        self.assertEqual(self.db.tables, [])
+        cursor = self.db.connection.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = 'batch_items'")
+        self.assertIsNone(cursor.fetchone())
+
+        # Після відкату та сама таблиця створюється знову без конфліктів
+        self.assertEqual(self.db.execute_batch([
+            {'op': 'create_table', 'args': ['batch_items', {'name': {'type': DataType.STRING}}]},
+            {'op': 'add_row', 'args': ['batch_items', {'name': 'first'}]},
+        ]), [True, 1])
+
+        print("✅ Тест 29 пройдено: Пакет зі створенням таблиці відкочується повністю")
+
+    def test_30_change_log_survives_schema_changes(self):
+        """Тест 30: Журнал змін зберігає значення переліків після видалення та перевизначення таблиці"""
+        self.db.enable_change_log()
+        self.db.define_enum('st', ['new', 'done'])
+        self.db.define_enum('level', ['low', 'high'])
+        self.db.create_table('tasks', {'state': {'type': DataType.ENUM, 'enum_name': 'st'}})
+        self.db.add_row('tasks', {'state': 'done'})
+        self.db.add_row('tasks', {'state': ''})
+        self.db.delete_table('tasks')
+        self.db.create_table('tasks', {'state': {'type': DataType.ENUM, 'enum_name': 'level'}})
+        self.db.add_row('tasks', {'state': 'high'})
+
+        changes = list(self.db.changes_since(0))
+        self.assertEqual([change['data']['state'] for change in changes if change['operation'] == 'insert'],
+                         ['done', '', 'high'])
+
+        replica = Database('restored_db')
+        replica.connect()
+        try:
+            replica.apply_changes(changes)
+            self.assertEqual(replica.get_rows('tasks'), self.db.get_rows('tasks'))
+            self.assertEqual(replica.get_rows('tasks')[0]['state'], 'high')
+        finally:
+            replica.disconnect()
+
+        print("✅ Тест 30 пройдено: Журнал змін не залежить від поточної схеми")
+
+    def test_31_segment_replay_keeps_fts_index(self):
+        """Тест 31: Відтворення сегмента оновлює повнотекстовий індекс замість заміни рядка"""
+        self.db.create_table('recipes', {'title': {'type': DataType.STRING, 'fts': True}})
+        row_id = self.db.add_row('recipes', {'title': 'apple pie'})
+        self.db.save_incremental('test_incremental.tdb')
+        self.db.update_row('recipes', row_id, {'title': 'banana split'})
+        self.db.save_incremental('test_incremental.tdb')
+        self.assertTrue(os.path.exists('test_incremental.tdb.segments'))
+
+        new_db = Database('restored_db')
+        try:
+            new_db.load_from_disk('test_incremental.tdb')
+            self.assertEqual(new_db.search('recipes', 'title', 'apple'), [])
+            self.assertEqual([row['id'] for row in new_db.search('recipes', 'title', 'banana')], [row_id])
+            # Перевірка узгодженості зовнішнього індексу FTS5 з таблицею-вмістом
+            new_db.connection.execute("INSERT INTO recipes__fts_title (recipes__fts_title) VALUES ('integrity-check')")
+        finally:
+            new_db.disconnect()
+            if os.path.exists("databases/restored_db.db"):
+                os.remove("databases/restored_db.db")
+
+        print("✅ Тест 31 пройдено: Індекс FTS узгоджений після відтворення сегментів")
+
 
 def run_tests():
     """Запуск тестів з детальним виводом"""